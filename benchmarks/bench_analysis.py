@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the analyses before and after the unfolding"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from phonopy.phonon.band_structure import get_band_qpoints
+from upho.analysis.smearing import Smearing
+from upho.analysis.fc_symmetrizer_spg import FCSymmetrizerSPG
+from upho.phonon.density_extractor import DensityExtractorHDF5
+from upho.phonon.sf_fitter import SFFitter
+from common import (
+    SIZES, read_ideal_cell, create_disordered_cell, create_force_constants,
+    create_phonon_unfolding)
+
+
+class TimeSmearing(object):
+    """"Smearing.run" for the frequencies and weights of 3 n^3 x 4 bands"""
+    params = (SIZES, [None, 5.0])
+    param_names = ['n', 'cutoff']
+
+    def setup(self, n, cutoff):
+        self.natoms = 4 * n ** 3
+        nbands = 3 * self.natoms
+        rng = np.random.RandomState(0)
+        self._peaks = rng.uniform(0.0, 10.0, nbands)
+        self._weights = rng.rand(4, nbands)
+        self._smearing = Smearing(
+            sigma=0.1, xmin=-1.0, xmax=11.0, xpitch=0.01, cutoff=cutoff)
+
+    def time_run(self, n, cutoff):
+        self._smearing.run(self._peaks, self._weights)
+
+
+class TimeFCSymmetrizerSPG(object):
+    params = SIZES
+    param_names = ['n']
+
+    def setup(self, n):
+        self._atoms_ideal = read_ideal_cell(n=n)
+        self._atoms = create_disordered_cell(self._atoms_ideal)
+        self.natoms = self._atoms.get_number_of_atoms()
+        self._force_constants = create_force_constants(self._atoms)
+
+    def time_average_force_constants_spg(self, n):
+        fc_symmetrizer = FCSymmetrizerSPG(
+            force_constants=self._force_constants.copy(),
+            atoms=self._atoms,
+            atoms_ideal=self._atoms_ideal,
+            is_symmetrized=False)
+        fc_symmetrizer.average_force_constants_spg()
+
+
+class TimeSFFitter(object):
+    """Fit of the spectral functions along a band path"""
+    params = (SIZES, ['curve_fit', 'batched'])
+    param_names = ['n', 'solver']
+
+    def setup(self, n, solver):
+        self._cwd = os.getcwd()
+        self._tmpdir = tempfile.mkdtemp()
+        os.chdir(self._tmpdir)
+
+        phonon = create_phonon_unfolding(n, star='sym')
+        self.natoms = phonon.get_unitcell().get_number_of_atoms()
+        bands = get_band_qpoints(
+            [np.array([[0.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.5, 0.5, 0.5]])],
+            11)
+        phonon.set_band_structure(bands)
+        DensityExtractorHDF5(
+            filename='band.hdf5', fmin=-1.0, fmax=8.0, fpitch=0.05,
+            sigma=0.1, is_squared=False)
+
+    def teardown(self, n, solver):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmpdir)
+
+    def time_fit(self, n, solver):
+        SFFitter(filename='sf.hdf5', name='gaussian', solver=solver)
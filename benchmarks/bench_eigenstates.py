@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the unfolding at each q-point and its setup"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import numpy as np
+from phonopy.structure.cells import guess_primitive_matrix
+from upho.harmonic.dynamical_matrix import get_smallest_vectors
+from upho.phonon.eigenstates import Eigenstates
+from common import SIZES, read_ideal_cell, create_phonon_unfolding
+
+
+class TimeEigenstates(object):
+    """"extract_eigenstates" at a general q-point of the ideal primitive"""
+    params = (SIZES, ['none', 'sym'])
+    param_names = ['n', 'star']
+
+    def setup(self, n, star):
+        phonon = create_phonon_unfolding(n)
+        unitcell_ideal = read_ideal_cell(n=n)
+        self.natoms = unitcell_ideal.get_number_of_atoms()
+        self._eigenstates = Eigenstates(
+            phonon.get_dynamical_matrix(),
+            unitcell_ideal,
+            guess_primitive_matrix(unitcell_ideal),
+            star=star)
+        self._qpoint = np.array([0.1, 0.2, 0.3])
+
+    def time_extract_eigenstates(self, n, star):
+        self._eigenstates.extract_eigenstates(self._qpoint)
+
+
+class TimeSmallestVectors(object):
+    params = SIZES
+    param_names = ['n']
+
+    def setup(self, n):
+        phonon = create_phonon_unfolding(n)
+        self.natoms = phonon.get_unitcell().get_number_of_atoms()
+        self._supercell = phonon.get_supercell()
+        self._primitive = phonon.get_primitive()
+
+    def time_get_smallest_vectors(self, n):
+        get_smallest_vectors(self._supercell, self._primitive, 1e-5)
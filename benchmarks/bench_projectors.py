@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the projections of the vectors"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import numpy as np
+from phonopy.structure.cells import get_primitive
+from upho.phonon.translational_projector import TranslationalProjector
+from upho.phonon.rotational_projector import RotationalProjector
+from common import SIZES, read_ideal_cell, create_vectors
+
+
+class TimeTranslationalProjector(object):
+    """"project_vectors" for all the bands of the disordered cell"""
+    params = SIZES
+    param_names = ['n']
+
+    def setup(self, n):
+        unitcell_ideal = read_ideal_cell(n=n)
+        primitive = get_primitive(
+            unitcell_ideal, np.linalg.inv(np.diag([n, n, n])))
+        self.natoms = unitcell_ideal.get_number_of_atoms()
+        self._projector = TranslationalProjector(primitive, unitcell_ideal)
+        self._vectors = create_vectors(self.natoms * 3, self.natoms * 3)
+        self._kpoint = np.array([0.25, 0.50, 0.75])
+
+    def time_project_vectors(self, n):
+        self._projector.project_vectors(self._vectors, self._kpoint)
+
+
+class TimeRotationalProjector(object):
+    """"project_vectors" for the cell of n x n x n conventional cells"""
+    params = SIZES
+    param_names = ['n']
+
+    def setup(self, n):
+        atoms = read_ideal_cell(n=n)
+        self.natoms = atoms.get_number_of_atoms()
+        self._projector = RotationalProjector(atoms)
+        self._kpoint = np.array([0.0, 0.25, 0.25])
+        self._projector.create_standard_rotations(self._kpoint)
+        self._vectors = create_vectors(self.natoms * 3, self.natoms * 3)
+
+    def time_project_vectors(self, n):
+        self._projector.project_vectors(
+            self._vectors, self._kpoint, np.eye(3, dtype=int))
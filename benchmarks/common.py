@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Synthetic disordered supercells and force constants for the benchmarks"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import os
+import numpy as np
+from phonopy.interface.vasp import read_vasp
+from phonopy.structure.cells import get_supercell
+from upho.api_unfolding import PhonopyUnfolding
+
+TESTS_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'tests')
+POSCAR_DIR = os.path.join(TESTS_DIR, 'poscars')
+L21_DIR = os.path.join(TESTS_DIR, 'L21_Cu3Au')
+
+# Sizes of the supercells (n x n x n conventional fcc cells, 4 n^3 atoms).
+# Overwritten by the "--sizes" option of "run.py".
+SIZES = [2, 3, 4]
+
+STRUCTURES = {
+    'fcc': os.path.join(POSCAR_DIR, 'POSCAR_fcc'),
+    'L21_Cu3Au': os.path.join(L21_DIR, 'POSCAR_ideal'),
+}
+
+
+def read_ideal_cell(structure='L21_Cu3Au', n=1):
+    """Read the ideal conventional cell and expand it n x n x n"""
+    unitcell = read_vasp(STRUCTURES[structure])
+    return get_supercell(unitcell, np.diag([n, n, n]))
+
+
+def create_disordered_cell(atoms_ideal, symbols=('Cu', 'Au'),
+                           concentrations=(0.75, 0.25), seed=0):
+    """Create a cell with the chemical symbols randomly distributed
+
+    The positions are the same as "atoms_ideal", and the numbers of the
+    atoms of the chemical symbols are fixed by "concentrations".
+    """
+    natoms = atoms_ideal.get_number_of_atoms()
+    numbers = np.rint(np.array(concentrations) * natoms).astype(int)
+    numbers[0] = natoms - np.sum(numbers[1:])
+    chemical_symbols = np.repeat(symbols, numbers)
+    np.random.RandomState(seed).shuffle(chemical_symbols)
+
+    atoms = atoms_ideal.copy()
+    atoms.set_chemical_symbols(list(chemical_symbols))
+    return atoms
+
+
+def create_force_constants(atoms, spring_constant=1.0, cutoff=0.75):
+    """Create force constants of central springs between nearest neighbors
+
+    The force constants satisfy the acoustic sum rule, and the springs are
+    made for the pairs closer than "cutoff" times the lattice constant of
+    the conventional cell with the minimum image convention.
+
+    Returns
+    -------
+    force_constants : (natoms, natoms, 3, 3) array
+    """
+    cell = atoms.get_cell()
+    scaled_positions = atoms.get_scaled_positions()
+    natoms = len(scaled_positions)
+
+    diff = scaled_positions[None, :, :] - scaled_positions[:, None, :]
+    diff -= np.rint(diff)
+    vectors = np.dot(diff, cell)
+    distances = np.linalg.norm(vectors, axis=-1)
+    lattice_constant = np.min(distances[distances > 1e-6]) * np.sqrt(2.0)
+    is_bonded = (distances > 1e-6) & (distances < cutoff * lattice_constant)
+
+    directions = np.zeros_like(vectors)
+    directions[is_bonded] = (
+        vectors[is_bonded] / distances[is_bonded][:, None])
+    force_constants = -spring_constant * (
+        directions[:, :, :, None] * directions[:, :, None, :])
+    force_constants[np.arange(natoms), np.arange(natoms)] = (
+        -np.sum(force_constants, axis=1))
+    return force_constants
+
+
+def create_phonon_unfolding(n, structure='L21_Cu3Au', **kwargs):
+    """Create "PhonopyUnfolding" for a disordered cell of n x n x n cells
+
+    The disordered cell is used as the unit cell and the supercell at once.
+    """
+    unitcell_ideal = read_ideal_cell(structure, n)
+    unitcell = create_disordered_cell(unitcell_ideal)
+    phonon = PhonopyUnfolding(
+        unitcell,
+        unitcell_ideal,
+        np.eye(3, dtype=int),
+        'auto',
+        **kwargs)
+    phonon.set_force_constants(create_force_constants(unitcell))
+    return phonon
+
+
+def create_vectors(nrows, ncols, seed=0):
+    rng = np.random.RandomState(seed)
+    return (rng.rand(nrows, ncols) + 1.0j * rng.rand(nrows, ncols))
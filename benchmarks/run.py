@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the benchmarks and record the timings versus the number of atoms
+
+The benchmarks are written in the style of airspeed velocity (asv):
+classes "Time*" in "bench_*.py" with "params", "param_names", "setup",
+and "time_*" methods.  This script runs them without asv and writes the
+scaling curves in a JSON file, e.g.
+
+    python benchmarks/run.py --sizes 2 3 4 -o benchmarks.json
+"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import argparse
+import contextlib
+import glob
+import importlib
+import inspect
+import itertools
+import json
+import os
+import sys
+import timeit
+import warnings
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# The working tree is benchmarked rather than the installed package.
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+
+def find_benchmarks(pattern=None):
+    """
+
+    Yields
+    ------
+    name : String
+        "{module}.{class}.{method}"
+    cls : Class
+    method_name : String
+    """
+    filenames = sorted(glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py')))
+    for filename in filenames:
+        module_name = os.path.splitext(os.path.basename(filename))[0]
+        module = importlib.import_module(module_name)
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if not (class_name.startswith('Time') and
+                    cls.__module__ == module_name):
+                continue
+            for method_name in sorted(dir(cls)):
+                if not method_name.startswith('time_'):
+                    continue
+                name = '{}.{}.{}'.format(module_name, class_name, method_name)
+                if pattern is None or pattern in name:
+                    yield name, cls, method_name
+
+
+def create_parameter_sets(cls, sizes=None):
+    params = cls.params
+    param_names = list(cls.param_names)
+    if len(param_names) == 1:
+        params = (params, )
+    params = [list(p) for p in params]
+    if sizes is not None and 'n' in param_names:
+        params[param_names.index('n')] = sizes
+    for values in itertools.product(*params):
+        yield dict(zip(param_names, values))
+
+
+def run_benchmark(cls, method_name, kwargs, repeat):
+    """Run a benchmark for a parameter set
+
+    The first call is not timed, and the minimum of "repeat" calls is
+    taken as in asv.  The stdout of upho is suppressed.
+    """
+    benchmark = cls()
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            benchmark.setup(**kwargs)
+            try:
+                method = getattr(benchmark, method_name)
+                method(**kwargs)
+                times = timeit.repeat(
+                    lambda: method(**kwargs), number=1, repeat=repeat)
+            finally:
+                if hasattr(benchmark, 'teardown'):
+                    benchmark.teardown(**kwargs)
+    return getattr(benchmark, 'natoms', None), times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output",
+                        default="benchmarks.json",
+                        type=str,
+                        help="JSON file to write the timings.")
+    parser.add_argument("-k", dest="pattern",
+                        type=str,
+                        help="Run only the benchmarks including the string.")
+    parser.add_argument("--sizes",
+                        nargs="+",
+                        type=int,
+                        help="Sizes n of the n x n x n supercells.")
+    parser.add_argument("--repeat",
+                        default=3,
+                        type=int,
+                        help="Number of the timed calls.")
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+
+    results = []
+    for name, cls, method_name in find_benchmarks(args.pattern):
+        for kwargs in create_parameter_sets(cls, args.sizes):
+            natoms, times = run_benchmark(cls, method_name, kwargs, args.repeat)
+            results.append({
+                'name': name,
+                'params': kwargs,
+                'natoms': natoms,
+                'times': times,
+                'min': min(times),
+            })
+            print('{:60s} {:30s} {:6d} {:12.6f}'.format(
+                name, json.dumps(kwargs), natoms, min(times)))
+            sys.stdout.flush()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
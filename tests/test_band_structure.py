@@ -0,0 +1,266 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import h5py
+import numpy as np
+from phonopy import Phonopy
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.interface.vasp import read_vasp
+from phonopy.phonon.band_structure import get_band_qpoints
+from upho.api_unfolding import PhonopyUnfolding
+from upho.analysis.time_measurer import get_profiler
+from phonopy.units import VaspToTHz
+from upho.phonon.eigenstates import read_weights, calculate_frequencies
+from upho.phonon.hdf5_layout import open_band_data
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+def create_force_constants(unitcell, supercell_matrix):
+    phonon = Phonopy(unitcell, supercell_matrix)
+    phonon.set_displacement_dataset(
+        parse_FORCE_SETS(filename=os.path.join(L21_DIR, 'FORCE_SETS')))
+    phonon.produce_force_constants()
+    return phonon.get_force_constants()
+
+
+class CountingExecutor(ProcessPoolExecutor):
+    """Executor plugged in instead of ProcessPoolExecutor"""
+    count = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingExecutor.count += 1
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+
+
+class TestBandStructure(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmpdir = tempfile.mkdtemp()
+        os.chdir(self._tmpdir)
+
+        self._phonon = self.create_phonon()
+        self._bands = get_band_qpoints(
+            [np.array([[0.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.5, 0.5, 0.5]])],
+            5)
+
+    def create_phonon(self, cache_dir=None):
+        unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+        unitcell_ideal = read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal'))
+        supercell_matrix = np.diag([2, 2, 2])
+        phonon = PhonopyUnfolding(
+            unitcell,
+            unitcell_ideal,
+            supercell_matrix,
+            'auto',
+            star='sym',
+            cache_dir=cache_dir)
+        phonon.set_force_constants(
+            create_force_constants(unitcell, supercell_matrix))
+        return phonon
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmpdir)
+
+    def run_band(self, n_workers, weights_storage='full',
+                 hdf5_layout='groups', is_resumed=False, executor_class=None):
+        self._phonon.set_band_structure(
+            self._bands, n_workers=n_workers, weights_storage=weights_storage,
+            hdf5_layout=hdf5_layout, is_resumed=is_resumed,
+            executor_class=executor_class)
+        keys = [
+            'point', 'q_star', 'distance', 'natoms_primitive', 'elements',
+            'num_arms', 'pointgroup_symbol', 'num_irreps', 'ir_labels',
+            'frequencies', 'weights_t', 'weights_e', 'weights_s',
+            'weights_s_e', 'weights_e2',
+        ]
+        data = {}
+        with h5py.File('band.hdf5', 'r') as f:
+            band_data = open_band_data(f)
+            for ipath, path in enumerate(self._bands):
+                for ip in range(len(path)):
+                    group = '{}/{}/'.format(ipath, ip)
+                    for k in keys:
+                        data[group + k] = np.array(
+                            read_weights(band_data[group + k]))
+        return data
+
+    def test_n_workers(self):
+        data_serial = self.run_band(n_workers=1)
+        data_parallel = self.run_band(n_workers=2)
+        self.assertEqual(sorted(data_serial), sorted(data_parallel))
+        for k, v in data_serial.items():
+            if v.dtype.kind in 'fc':
+                self.assertTrue(
+                    np.allclose(v, data_parallel[k], equal_nan=True), msg=k)
+            else:
+                self.assertTrue(np.array_equal(v, data_parallel[k]), msg=k)
+
+    def test_executor_class(self):
+        data_serial = self.run_band(n_workers=1)
+        data_parallel = self.run_band(
+            n_workers=2, executor_class=CountingExecutor)
+        self.assertEqual(CountingExecutor.count, 1)
+        for k, v in data_serial.items():
+            self.assertTrue(np.array_equal(
+                v, data_parallel[k], equal_nan=(v.dtype.kind in 'fc')),
+                msg=k)
+
+    def test_weights_storage(self):
+        data_full = self.run_band(n_workers=1)
+        data_packed = self.run_band(n_workers=1, weights_storage='packed')
+        prec = 1e-6
+        for k, v in data_full.items():
+            if k.endswith('weights_e') or k.endswith('weights_s_e'):
+                self.assertEqual(v.shape, data_packed[k].shape)
+                self.assertTrue(
+                    np.all(np.abs(v - data_packed[k]) < prec), msg=k)
+
+    def test_hdf5_layout(self):
+        data_groups = self.run_band(n_workers=1)
+        data_consolidated = self.run_band(
+            n_workers=1, hdf5_layout='consolidated')
+        for k, v in data_groups.items():
+            self.assertEqual(v.shape, data_consolidated[k].shape, msg=k)
+            if v.dtype.kind in 'fc':
+                self.assertTrue(np.array_equal(
+                    v, data_consolidated[k], equal_nan=True), msg=k)
+            else:
+                self.assertTrue(
+                    np.array_equal(v, data_consolidated[k]), msg=k)
+
+    def test_cache_dir(self):
+        data = self.run_band(n_workers=1)
+        cache_dir = os.path.join(self._tmpdir, 'cache')
+        for _ in range(2):  # Arrays are saved and then loaded.
+            self._phonon = self.create_phonon(cache_dir=cache_dir)
+            data_cached = self.run_band(n_workers=1)
+            for k, v in data.items():
+                self.assertTrue(np.array_equal(
+                    v, data_cached[k], equal_nan=(v.dtype.kind in 'fc')),
+                    msg=k)
+        names = sorted(f.split('_')[0] for f in os.listdir(cache_dir))
+        self.assertEqual(names, ['smallest', 'star', 'translational'])
+
+    def test_profile(self):
+        profiler = get_profiler()
+        profiler.set_enabled(True)
+        try:
+            for n_workers in [1, 2]:
+                profiler.reset()
+                self.run_band(n_workers=n_workers)
+                with h5py.File('band.hdf5', 'r') as f:
+                    data = json.loads(f.attrs['profile'])
+                nqpoints = sum(len(path) for path in self._bands)
+                self.assertEqual(data['counters']['qpoints'], nqpoints)
+                for path in ['qpoint', 'qpoint/eigh', 'hdf5_write']:
+                    self.assertEqual(
+                        data['timings'][path]['count'], nqpoints, msg=path)
+                self.assertGreaterEqual(data['timings']['setup']['count'], 1)
+        finally:
+            profiler.set_enabled(False)
+            profiler.reset()
+
+    def test_resume(self):
+        for hdf5_layout in ['groups', 'consolidated']:
+            data = self.run_band(n_workers=1, hdf5_layout=hdf5_layout)
+
+            with h5py.File('band.hdf5', 'a') as f:
+                if hdf5_layout == 'groups':
+                    # Completed point, which must be kept as it is.
+                    f['0/1/frequencies'][0, 0] = -1.0
+                    # Interrupted points.
+                    del f['0/2/']
+                    del f['0/3/weights_e']
+                    f['0/3/'].attrs['completed'] = False
+                else:
+                    f['frequencies'][0, 1, 0, 0] = -1.0
+                    f['frequencies'][0, 2] = 0.0
+                    f['_completed'][0, 2] = False
+
+            data_resumed = self.run_band(
+                n_workers=1, hdf5_layout=hdf5_layout, is_resumed=True)
+            self.assertEqual(data_resumed['0/1/frequencies'][0, 0], -1.0)
+            data_resumed['0/1/frequencies'][0, 0] = (
+                data['0/1/frequencies'][0, 0])
+            for k, v in data.items():
+                self.assertTrue(np.array_equal(
+                    v, data_resumed[k], equal_nan=(v.dtype.kind in 'fc')),
+                    msg=k)
+
+    def test_resume_different_inputs(self):
+        self.run_band(n_workers=1)
+        self._phonon = self.create_phonon()
+        self._phonon.set_force_constants(
+            self._phonon.get_force_constants() * 1.01)
+        with self.assertRaises(ValueError):
+            self.run_band(n_workers=1, is_resumed=True)
+        with self.assertRaises(ValueError):
+            self.run_band(n_workers=1, hdf5_layout='consolidated',
+                          is_resumed=True)
+
+    def create_phonon_mesh(self):
+        phonon = PhonopyUnfolding(
+            read_vasp(os.path.join(L21_DIR, 'POSCAR')),
+            read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal')),
+            np.diag([2, 2, 2]),
+            'auto')
+        phonon.set_force_constants(create_force_constants(
+            phonon.get_unitcell(), np.diag([2, 2, 2])))
+        return phonon
+
+    def test_resume_without_input_hash(self):
+        with h5py.File('band.hdf5', 'w') as f:
+            f.create_dataset('paths', data=np.array(self._bands))
+        with self.assertRaisesRegex(ValueError, 'input_hash'):
+            self.run_band(n_workers=1, is_resumed=True)
+
+    def test_mesh_eigenvectors(self):
+        self._phonon = self.create_phonon_mesh()
+        results = []
+        for n_workers in [1, 2]:
+            self._phonon.set_mesh(
+                [2, 2, 2], is_eigenvectors=True, n_workers=n_workers)
+            mesh = self._phonon._mesh
+            results.append((mesh.get_eigenvalues(), mesh.get_eigenvectors(),
+                            mesh.get_frequencies()))
+        eigenvalues, eigenvectors, frequencies = results[0]
+        for eigvals, eigvecs in zip(eigenvalues, eigenvectors):
+            nbands = len(eigvals)
+            self.assertTrue(np.allclose(
+                np.dot(eigvecs.conj().T, eigvecs), np.eye(nbands)))
+        self.assertTrue(np.allclose(
+            frequencies, calculate_frequencies(eigenvalues, VaspToTHz)))
+        for x, y in zip(results[0], results[1]):
+            self.assertTrue(np.allclose(x, y))
+
+    def test_mesh_resume(self):
+        kwargs = {'checkpoint_filename': 'mesh_checkpoint.hdf5'}
+        self._phonon = self.create_phonon_mesh()
+        self._phonon.set_mesh([2, 2, 2], **kwargs)
+        frequencies = self._phonon.get_mesh()[2]
+
+        with h5py.File('mesh_checkpoint.hdf5', 'a') as f:
+            f['frequencies'][0, 0] = -1.0  # Completed
+            f['completed'][1] = False  # Interrupted
+        self._phonon.set_mesh([2, 2, 2], is_resumed=True, **kwargs)
+        frequencies_resumed = self._phonon.get_mesh()[2]
+        self.assertEqual(frequencies_resumed[0, 0], -1.0)
+        frequencies_resumed[0, 0] = frequencies[0, 0]
+        self.assertTrue(np.array_equal(frequencies, frequencies_resumed))
+
+    def test_sum_weights(self):
+        data = self.run_band(n_workers=1)
+        prec = 1e-9
+        natoms_p = 1
+        for k, v in data.items():
+            if k.endswith('weights_t') or k.endswith('weights_s'):
+                self.assertTrue(abs(np.sum(v) - natoms_p * 3) < prec, msg=k)
+
+
+if __name__ == "__main__":
+    unittest.main()
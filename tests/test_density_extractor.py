@@ -0,0 +1,110 @@
+import unittest
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from phonopy import Phonopy
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.interface.vasp import read_vasp
+from phonopy.phonon.band_structure import get_band_qpoints
+from upho.api_unfolding import PhonopyUnfolding
+from upho.phonon.density_extractor import DensityExtractorHDF5
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+def create_band_hdf5():
+    unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+    unitcell_ideal = read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal'))
+    supercell_matrix = np.diag([2, 2, 2])
+
+    phonon = Phonopy(unitcell, supercell_matrix)
+    phonon.set_displacement_dataset(
+        parse_FORCE_SETS(filename=os.path.join(L21_DIR, 'FORCE_SETS')))
+    phonon.produce_force_constants()
+
+    phonon_unfolding = PhonopyUnfolding(
+        unitcell, unitcell_ideal, supercell_matrix, 'auto', star='sym')
+    phonon_unfolding.set_force_constants(phonon.get_force_constants())
+    bands = get_band_qpoints(
+        [np.array([[0.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.5, 0.5, 0.5]])], 4)
+    phonon_unfolding.set_band_structure(bands)
+
+
+def read_sf(filename='sf.hdf5'):
+    data = {}
+    with h5py.File(filename, 'r') as f:
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                data[name] = np.array(obj)
+        f.visititems(visit)
+    return data
+
+
+class TestDensityExtractor(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmpdir = tempfile.mkdtemp()
+        os.chdir(self._tmpdir)
+        create_band_hdf5()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmpdir)
+
+    def run_extractor(self, **kwargs):
+        DensityExtractorHDF5(
+            filename='band.hdf5', fmin=-1.0, fmax=8.0, fpitch=0.1,
+            sigma=0.2, is_squared=False, **kwargs)
+        return read_sf()
+
+    def check_same(self, data0, data1):
+        self.assertEqual(sorted(data0), sorted(data1))
+        for k, v in data0.items():
+            if v.dtype.kind in 'fc':
+                self.assertTrue(
+                    np.allclose(v, data1[k], equal_nan=True), msg=k)
+            else:
+                self.assertTrue(np.array_equal(v, data1[k]), msg=k)
+
+    def test_n_workers(self):
+        data_serial = self.run_extractor()
+        data_parallel = self.run_extractor(n_workers=2)
+        self.check_same(data_serial, data_parallel)
+
+    def test_resume(self):
+        data = self.run_extractor()
+
+        with h5py.File('sf.hdf5', 'a') as f:
+            # Completed group, which must be kept as it is.
+            f['0/1/total_sf'][0] = -1.0
+            # Interrupted groups.
+            del f['0/2/']
+            del f['0/3/partial_sf_s']
+            f['0/3/'].attrs['completed'] = False
+
+        data_resumed = self.run_extractor(is_resumed=True)
+        self.assertEqual(data_resumed['0/1/total_sf'][0], -1.0)
+        data_resumed['0/1/total_sf'][0] = data['0/1/total_sf'][0]
+        self.check_same(data, data_resumed)
+
+    def test_resume_different_parameters(self):
+        self.run_extractor()
+        with self.assertRaises(ValueError):
+            DensityExtractorHDF5(
+                filename='band.hdf5', fmin=-1.0, fmax=8.0, fpitch=0.1,
+                sigma=0.3, is_squared=False, is_resumed=True)
+
+    def test_resume_different_cutoff(self):
+        self.run_extractor()
+        with self.assertRaises(ValueError):
+            self.run_extractor(cutoff=3.0, is_resumed=True)
+        self.run_extractor(cutoff=3.0)
+        self.run_extractor(cutoff=3.0, is_resumed=True)
+        with self.assertRaises(ValueError):
+            self.run_extractor(is_resumed=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import os
+import numpy as np
+from phonopy import Phonopy
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.interface.vasp import read_vasp
+from phonopy.harmonic.dynamical_matrix import DynamicalMatrix
+from upho.harmonic.dynamical_matrix import UnfolderDynamicalMatrix
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+class TestUnfolderDynamicalMatrix(unittest.TestCase):
+    def setUp(self):
+        unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+        phonon = Phonopy(unitcell, np.diag([2, 2, 2]))
+        phonon.set_displacement_dataset(
+            parse_FORCE_SETS(filename=os.path.join(L21_DIR, 'FORCE_SETS')))
+        phonon.produce_force_constants()
+        self._supercell = phonon.get_supercell()
+        self._primitive = phonon.get_primitive()
+        self._force_constants = phonon.get_force_constants()
+        self._qpoints = np.array([
+            [0.00, 0.00, 0.00],
+            [0.50, 0.50, 0.50],
+            [0.10, -0.20, 0.30],
+            [1.25, 0.00, -0.75],
+        ])
+        self._prec = 1e-12
+
+    def test_get_dynamical_matrices(self):
+        dynamical_matrix_phonopy = DynamicalMatrix(
+            self._supercell, self._primitive, self._force_constants)
+        dynamical_matrix = UnfolderDynamicalMatrix(
+            self._supercell, self._primitive, self._force_constants)
+
+        dms = dynamical_matrix.get_dynamical_matrices(self._qpoints)
+        for q, dm in zip(self._qpoints, dms):
+            dynamical_matrix_phonopy.set_dynamical_matrix(q)
+            dm_expected = dynamical_matrix_phonopy.get_dynamical_matrix()
+            self.assertTrue(np.all(np.abs(dm - dm_expected) < self._prec))
+
+            dynamical_matrix.set_dynamical_matrix(q)
+            dm_single = dynamical_matrix.get_dynamical_matrix()
+            self.assertTrue(np.all(np.abs(dm_single - dm) < self._prec))
+
+
+if __name__ == "__main__":
+    unittest.main()
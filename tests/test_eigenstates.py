@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+from upho.phonon.eigenstates import (
+    calculate_element_pair_weights,
+    pack_element_pair_weights,
+    unpack_element_pair_weights)
+
+
+class TestEigenstates(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        shape = (2, 3, 2, 9, 5)  # (nirreps, natoms_p, nelms, natoms_p * 3, nbands)
+        self._vectors = (
+            np.random.rand(*shape) + 1.0j * np.random.rand(*shape))
+        self._prec = 1e-12
+
+    def test_calculate_element_pair_weights(self):
+        vectors = self._vectors
+        weights = calculate_element_pair_weights(vectors)
+        self.assertEqual(weights.shape, (2, 3, 2, 3, 2, 5))
+        for i in range(vectors.shape[0]):
+            for j in range(vectors.shape[-1]):
+                weights_expected = np.inner(
+                    np.conj(vectors[i, ..., j]), vectors[i, ..., j])
+                self.assertTrue(np.all(
+                    np.abs(weights[i, ..., j] - weights_expected) < self._prec))
+
+    def test_upper_triangle(self):
+        weights = calculate_element_pair_weights(self._vectors)
+        weights_packed = pack_element_pair_weights(weights)
+        self.assertEqual(weights_packed.shape, (2, 21, 5))
+        weights_expanded = unpack_element_pair_weights(
+            weights_packed, weights.shape)
+        self.assertTrue(np.all(
+            np.abs(weights_expanded - weights) < self._prec))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -116,5 +116,13 @@ class TestElementWeightsCalculator(unittest.TestCase):
         self.assertTrue(
             np.all(projected_vectors == projected_vectors_expected))
 
+        projected_vectors_segmented = np.zeros_like(projected_vectors)
+        blocks = elemental_projector.project_vectors_segmented(vectors)
+        self.assertEqual(len(blocks), 2)
+        for ip, ie, indices, vectors_block in blocks:
+            projected_vectors_segmented[ip, ie, indices] = vectors_block
+        self.assertTrue(
+            np.all(projected_vectors_segmented == projected_vectors_expected))
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,226 @@
+import unittest
+import itertools
+import os
+import numpy as np
+from phonopy import Phonopy
+from phonopy.file_IO import parse_FORCE_SETS
+from phonopy.interface.vasp import read_vasp
+from phonopy.structure.symmetry import Symmetry
+from upho.analysis.fc_symmetrizer_spg import FCSymmetrizerSPG, get_matrix_std
+from upho.analysis.mappings_modifier import MappingsModifier
+from upho.structure.symtools import get_rotations_cart
+from upho.structure.structure_analyzer import StructureAnalyzer
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+def average_force_constants_spg_loop(fc_symmetrizer, symprec=1e-5):
+    """Reference implementation with explicit loops"""
+    atoms = fc_symmetrizer.get_atoms()
+    fc_orig = fc_symmetrizer.get_force_constants()
+    atoms_symmetry = fc_symmetrizer.get_atoms_ideal()
+
+    symmetry = Symmetry(atoms_symmetry)
+
+    symbols = atoms.get_chemical_symbols()
+    symboltypes = sorted(set(symbols), key=symbols.index)
+
+    rotations_cart = get_rotations_cart(atoms_symmetry)
+    mappings = StructureAnalyzer(
+        atoms_symmetry).get_mappings_for_symops(prec=symprec)
+    mappings_inv = MappingsModifier(mappings).invert_mappings()
+    natoms = mappings.shape[1]
+
+    fc_mean = np.zeros_like(fc_orig)
+    fc_mean_square = np.zeros_like(fc_orig)
+
+    fc_mean_symbols, fc_mean_square_symbols, fc_std_symbols, counters = (
+        FCSymmetrizerSPG.initialize_fc_symbols(fc_orig, symboltypes))
+
+    for (minv, r) in zip(mappings_inv, rotations_cart):
+        for i1 in symmetry.get_independent_atoms():
+            for i2 in range(natoms):
+                j1 = minv[i1]
+                j2 = minv[i2]
+                s1 = symbols[j1]
+                s2 = symbols[j2]
+
+                tmp = np.dot(np.dot(r, fc_orig[j1, j2]), r.T)
+                tmp2 = tmp ** 2
+                fc_mean[i1, i2] += tmp
+                fc_mean_square[i1, i2] += tmp2
+
+                fc_mean_symbols[(s1, s2)][i1, i2] += tmp
+                fc_mean_square_symbols[(s1, s2)][i1, i2] += tmp2
+
+                counters[(s1, s2)][i1, i2] += 1
+
+    fc_mean        /= float(len(rotations_cart))
+    fc_mean_square /= float(len(rotations_cart))
+
+    for i1 in symmetry.get_independent_atoms():
+        for i2 in range(natoms):
+            for (key, c) in counters.items():
+                if c[i1, i2] != 0:
+                    fc_mean_symbols       [key][i1, i2] /= c[i1, i2]
+                    fc_mean_square_symbols[key][i1, i2] /= c[i1, i2]
+                else:
+                    fc_mean_symbols       [key][i1, i2] = np.nan
+                    fc_mean_square_symbols[key][i1, i2] = np.nan
+
+    fc_std = get_matrix_std(fc_mean, fc_mean_square)
+    for key in counters.keys():
+        fc_std_symbols[key] = get_matrix_std(
+            fc_mean_symbols[key], fc_mean_square_symbols[key])
+
+    fc_mean = distribute_force_constants_spg_loop(
+        fc_mean, symmetry, rotations_cart, mappings)
+    fc_std = distribute_force_constants_spg_loop(
+        fc_std, symmetry, rotations_cart, mappings)
+    for key in counters.keys():
+        fc_mean_symbols[key] = distribute_force_constants_spg_loop(
+            fc_mean_symbols[key], symmetry, rotations_cart, mappings)
+        fc_std_symbols[key] = distribute_force_constants_spg_loop(
+            fc_std_symbols[key], symmetry, rotations_cart, mappings)
+
+    fc_std = np.abs(fc_std)
+    for key in counters.keys():
+        fc_std_symbols[key] = np.abs(fc_std_symbols[key])
+
+    return fc_mean, fc_std, fc_mean_symbols, fc_std_symbols
+
+
+def average_force_constants_spg_full_loop(fc_symmetrizer, symprec=1e-5):
+    """Reference implementation with explicit loops"""
+    atoms = fc_symmetrizer.get_atoms()
+    fc_orig = fc_symmetrizer.get_force_constants()
+    symbols = atoms.get_chemical_symbols()
+    symboltypes = sorted(set(symbols), key=symbols.index)
+
+    atoms_symmetry = fc_symmetrizer.get_atoms_ideal()
+    rotations_cart = get_rotations_cart(atoms_symmetry)
+    mappings = StructureAnalyzer(
+        atoms_symmetry).get_mappings_for_symops(prec=symprec)
+    (nsym, natoms) = mappings.shape
+
+    shape = fc_orig.shape
+    fc_mean = np.zeros(shape)
+    fc_sd = np.zeros(shape)
+    fc_pair = {}
+    fc_pair_sd = {}
+    pair_counters = {}
+    for s1 in symboltypes:
+        for s2 in symboltypes:
+            fc_pair[(s1, s2)] = np.zeros(shape)
+            fc_pair_sd[(s1, s2)] = np.zeros(shape)
+            pair_counters[(s1, s2)] = np.zeros((natoms, natoms), dtype=int)
+
+    for (m, r) in zip(mappings, rotations_cart):
+        for i1 in range(natoms):
+            for i2 in range(natoms):
+                j1 = m[i1]
+                j2 = m[i2]
+                key = (symbols[i1], symbols[i2])
+                tmp = np.dot(np.dot(r, fc_orig[i1, i2]), r.T)
+                tmp2 = tmp ** 2
+                fc_mean[j1, j2] += tmp
+                fc_sd[j1, j2] += tmp2
+                fc_pair[key][j1, j2] += tmp
+                fc_pair_sd[key][j1, j2] += tmp2
+                pair_counters[key][j1, j2] += 1
+
+    fc_mean /= float(nsym)
+    fc_sd /= float(nsym)
+    fc_sd = get_matrix_std(fc_mean, fc_sd)
+
+    for key in pair_counters:
+        for (i1, i2) in itertools.product(range(natoms), repeat=2):
+            cval = pair_counters[key][i1, i2]
+            if cval != 0:
+                fc_pair[key][i1, i2] /= cval
+                fc_pair_sd[key][i1, i2] /= cval
+            else:
+                fc_pair[key][i1, i2] = np.nan
+                fc_pair_sd[key][i1, i2] = np.nan
+        fc_pair_sd[key] = get_matrix_std(fc_pair[key], fc_pair_sd[key])
+
+    return fc_mean, fc_sd, fc_pair, fc_pair_sd, pair_counters
+
+
+def distribute_force_constants_spg_loop(fc, symmetry, rotations_cart, mappings):
+    """Reference implementation with explicit loops"""
+    fc_distributed = np.zeros_like(fc)
+    natoms = fc_distributed.shape[0]
+    map_atoms = symmetry.get_map_atoms()
+    map_operations = symmetry.get_map_operations()
+    for i in range(natoms):
+        i_equiv = map_atoms[i]
+        iop = map_operations[i]
+        r = rotations_cart[iop]
+        for j in range(natoms):
+            j_equiv = mappings[iop, j]
+            fc_distributed[i, j] = np.dot(np.dot(r.T, fc[i_equiv, j_equiv]), r)
+    return fc_distributed
+
+
+class TestFCSymmetrizerSPG(unittest.TestCase):
+    def setUp(self):
+        unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+        unitcell_ideal = read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal'))
+        supercell_matrix = np.diag([2, 2, 2])
+
+        phonon = Phonopy(unitcell, supercell_matrix)
+        phonon.set_displacement_dataset(
+            parse_FORCE_SETS(filename=os.path.join(L21_DIR, 'FORCE_SETS')))
+        phonon.produce_force_constants()
+
+        self._fc_symmetrizer = FCSymmetrizerSPG(
+            force_constants=phonon.get_force_constants(),
+            atoms=unitcell,
+            atoms_ideal=unitcell_ideal,
+            supercell_matrix=supercell_matrix)
+
+    def check_equal(self, a, b):
+        self.assertTrue(np.array_equal(a, b, equal_nan=True))
+
+    def check_results(self, fc_mean, fc_std, fc_pair, fc_pair_sd):
+        fc_symmetrizer = self._fc_symmetrizer
+        self.check_equal(
+            fc_symmetrizer.get_force_constants_symmetrized(), fc_mean)
+        self.check_equal(fc_symmetrizer.get_force_constants_sd(), fc_std)
+        self.assertEqual(
+            sorted(fc_symmetrizer.get_force_constants_pair()), sorted(fc_pair))
+        for key, v in fc_pair.items():
+            self.check_equal(
+                fc_symmetrizer.get_force_constants_pair()[key], v)
+            self.check_equal(
+                fc_symmetrizer.get_force_constants_pair_sd()[key],
+                fc_pair_sd[key])
+
+    def test_average_force_constants_spg(self):
+        fc_symmetrizer = self._fc_symmetrizer
+        fc_mean, fc_std, fc_pair, fc_pair_sd = (
+            average_force_constants_spg_loop(fc_symmetrizer))
+        fc_symmetrizer.average_force_constants_spg()
+        self.check_results(fc_mean, fc_std, fc_pair, fc_pair_sd)
+
+    def test_average_force_constants_spg_full(self):
+        # The unit cell is used to keep the reference loops short.
+        unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+        unitcell_ideal = read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal'))
+        natoms = unitcell.get_number_of_atoms()
+        rng = np.random.RandomState(0)
+        self._fc_symmetrizer = fc_symmetrizer = FCSymmetrizerSPG(
+            force_constants=rng.rand(natoms, natoms, 3, 3),
+            atoms=unitcell,
+            atoms_ideal=unitcell_ideal)
+        fc_mean, fc_std, fc_pair, fc_pair_sd, pair_counters = (
+            average_force_constants_spg_full_loop(fc_symmetrizer))
+        fc_symmetrizer.average_force_constants_spg_full()
+        self.check_results(fc_mean, fc_std, fc_pair, fc_pair_sd)
+        for key, v in pair_counters.items():
+            self.check_equal(fc_symmetrizer.get_pair_counters()[key], v)
+
+
+if __name__ == "__main__":
+    unittest.main()
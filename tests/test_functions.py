@@ -1,6 +1,7 @@
 import unittest
 import numpy as np
-from upho.analysis.functions import lorentzian_unnormalized
+from upho.analysis.functions import (
+    lorentzian_unnormalized, FittingFunctionFactory)
 
 
 class TestFunctions(unittest.TestCase):
@@ -28,6 +29,29 @@ class TestFunctions(unittest.TestCase):
                     if not np.isnan(ratio):
                         self.assertTrue(np.abs(ratio - 1.0) < prec)
 
+    def test_jacobians(self):
+        xs = np.linspace(-2.0, 5.0, 71)
+        position = 1.3
+        width = 0.7
+        norm = 2.0
+        h = 1e-6
+        prec = 1e-6
+        for name in ['gaussian', 'lorentzian']:
+            factory = FittingFunctionFactory(name=name, is_normalized=False)
+            f = factory.create()
+            d_position, d_width = factory.create_jacobian()(
+                xs, position, width, norm)
+            d_position_expected = (
+                f(xs, position + h, width, norm) -
+                f(xs, position - h, width, norm)) / (2.0 * h)
+            d_width_expected = (
+                f(xs, position, width + h, norm) -
+                f(xs, position, width - h, norm)) / (2.0 * h)
+            self.assertTrue(
+                np.all(np.abs(d_position - d_position_expected) < prec))
+            self.assertTrue(
+                np.all(np.abs(d_width - d_width_expected) < prec))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from scipy.optimize import curve_fit
+from upho.analysis.functions import FittingFunctionFactory
+from upho.analysis.least_squares import fit_peaks
+
+
+class TestLeastSquares(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self._xs = np.linspace(-1.0, 8.0, 181)
+        self._positions = np.array([0.5, 2.0, 3.7, 6.1])
+        self._widths = np.array([0.2, 0.5, 0.3, 1.2])
+        self._norms = np.array([1.0, 2.0, 1.0, 3.0])
+
+    def check(self, name):
+        factory = FittingFunctionFactory(name=name, is_normalized=False)
+        f = factory.create()
+        jacobian = factory.create_jacobian()
+
+        xs = self._xs
+        ys = f(xs, self._positions[:, None], self._widths[:, None],
+               self._norms[:, None])
+        ys += np.random.rand(*ys.shape) * 0.01
+
+        p0 = np.stack((self._positions + 0.1, np.full(4, 0.1)), axis=-1)
+        params, nfev = fit_peaks(
+            f, jacobian, xs, ys, p0, self._norms, maxfev=1000)
+        self.assertTrue(np.all(nfev < 1000))
+
+        for i, (y, p, norm) in enumerate(zip(ys, p0, self._norms)):
+            def g(x, position, width):
+                return f(x, position, width, norm)
+            params_expected = curve_fit(g, xs, y, p0=p)[0]
+            self.assertTrue(
+                np.all(np.abs(params[i] - params_expected) < 1e-6))
+
+    def test_gaussian(self):
+        self.check('gaussian')
+
+    def test_lorentzian(self):
+        self.check('lorentzian')
+
+
+if __name__ == "__main__":
+    unittest.main()
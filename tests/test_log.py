@@ -0,0 +1,36 @@
+import unittest
+import logging
+from upho.log import LOGGER_NAME, set_log_level, log_point
+
+
+class TestLog(unittest.TestCase):
+    def tearDown(self):
+        set_log_level(0)
+
+    def test_set_log_level(self):
+        logger = logging.getLogger('upho.phonon.eigenstates')
+        set_log_level(0)
+        nhandlers = len(logging.getLogger(LOGGER_NAME).handlers)
+        for log_level, is_info, is_debug in [
+                (0, False, False), (1, True, False), (2, True, True)]:
+            set_log_level(log_level)
+            self.assertEqual(logger.isEnabledFor(logging.INFO), is_info)
+            self.assertEqual(logger.isEnabledFor(logging.DEBUG), is_debug)
+            self.assertTrue(logger.isEnabledFor(logging.WARNING))
+        # The handler is not added again.
+        self.assertEqual(
+            len(logging.getLogger(LOGGER_NAME).handlers), nhandlers)
+
+    def test_log_point(self):
+        logger = logging.getLogger('upho.test')
+        with self.assertLogs(logger, level='DEBUG') as cm:
+            for ip in range(3):
+                log_point(logger, '1/{}/'.format(ip), 3)
+        self.assertEqual(
+            [(r.levelname, r.getMessage()) for r in cm.records],
+            [('DEBUG', '1/0/'), ('DEBUG', '1/1/'), ('DEBUG', '1/2/'),
+             ('INFO', 'Path 1 (3 points) finished.')])
+
+
+if __name__ == "__main__":
+    unittest.main()
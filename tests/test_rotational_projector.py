@@ -56,6 +56,27 @@ class TestRotationalProjector(unittest.TestCase):
         self._kpoint = np.array([0.00, 0.05, 0.05])
         self.check()
 
+    def test_cache_fcc(self):
+        kpoints = [
+            np.array([0.00, 0.05, 0.05]),
+            np.array([0.00, 0.10, 0.10]),
+            np.array([0.00, 0.15, 0.15]),
+        ]
+        self.load_fcc()
+        rotational_projector = self._rotational_projector
+        for kpoint in kpoints:
+            rotational_projector.create_standard_rotations(kpoint)
+            r_proj_vectors = rotational_projector.project_vectors(
+                self._vectors, kpoint, np.eye(3, dtype=int))
+
+            self.load_fcc()  # New projector without cached data
+            self._rotational_projector.create_standard_rotations(kpoint)
+            r_proj_vectors_expected = self._rotational_projector.project_vectors(
+                self._vectors, kpoint, np.eye(3, dtype=int))
+            self.assertTrue(np.allclose(r_proj_vectors, r_proj_vectors_expected))
+        # The little group is the same along the line.
+        self.assertEqual(len(rotational_projector._group_data_cache), 1)
+
     # def test_4_fcc(self):
     #     self.load_fcc()
     #     self._kpoint = np.array([0.75, 0.50, 0.25])
@@ -0,0 +1,55 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from phonopy.interface.vasp import read_vasp
+from upho.structure.setup_cache import SetupCache, create_hash
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+class TestSetupCache(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._cache_dir = os.path.join(self._tmpdir, 'cache')
+        self._atoms = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def test_create_hash(self):
+        atoms = self._atoms
+        items = [atoms, np.eye(3), 1e-5]
+        self.assertEqual(create_hash(items), create_hash(items))
+        self.assertEqual(
+            create_hash(items), create_hash([atoms, np.eye(3, dtype=int), 1e-5]))
+        self.assertNotEqual(
+            create_hash(items), create_hash([atoms, np.eye(3), 1e-6]))
+        self.assertNotEqual(
+            create_hash([None]), create_hash(['None']))
+
+        atoms_ideal = read_vasp(os.path.join(L21_DIR, 'POSCAR_ideal'))
+        self.assertNotEqual(
+            create_hash(items), create_hash([atoms_ideal, np.eye(3), 1e-5]))
+
+    def test_get(self):
+        cache = SetupCache(self._cache_dir)
+        items = [self._atoms, 1e-5]
+        ncalls = []
+
+        def function():
+            ncalls.append(1)
+            return {'a': np.arange(3), 'b': np.eye(3)}
+
+        self.assertIsNone(cache.load('test', items))
+        for _ in range(2):
+            arrays = cache.get('test', items, function)
+            self.assertTrue(np.array_equal(arrays['a'], np.arange(3)))
+            self.assertTrue(np.array_equal(arrays['b'], np.eye(3)))
+        self.assertEqual(len(ncalls), 1)
+        self.assertEqual(len(os.listdir(self._cache_dir)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from upho.phonon.density_extractor import DensityExtractorHDF5
+from upho.phonon.sf_fitter import SFFitter, select_better_fits
+from test_density_extractor import create_band_hdf5, read_sf
+
+
+class TestSFFitter(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmpdir = tempfile.mkdtemp()
+        os.chdir(self._tmpdir)
+        create_band_hdf5()
+        DensityExtractorHDF5(
+            filename='band.hdf5', fmin=-1.0, fmax=8.0, fpitch=0.05,
+            sigma=0.1, is_squared=False)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self._tmpdir)
+
+    def run_fitter(self, **kwargs):
+        SFFitter(filename='sf.hdf5', name='gaussian', **kwargs)
+        return read_sf('sf_fit.hdf5')
+
+    def test_solver(self):
+        data_curve_fit = self.run_fitter()
+        data_batched = self.run_fitter(solver='batched')
+        data_parallel = self.run_fitter(solver='batched', n_workers=2)
+        self.assertEqual(sorted(data_curve_fit), sorted(data_batched))
+        for k, v in data_curve_fit.items():
+            if k.endswith('nfev_s'):
+                self.assertTrue(np.array_equal(
+                    data_batched[k], data_parallel[k]), msg=k)
+            elif v.dtype.kind in 'fc':
+                self.assertTrue(np.allclose(
+                    v, data_batched[k], atol=1e-3, equal_nan=True), msg=k)
+                self.assertTrue(np.array_equal(
+                    data_batched[k], data_parallel[k], equal_nan=True), msg=k)
+            else:
+                self.assertTrue(np.array_equal(v, data_batched[k]), msg=k)
+
+    def test_continuation(self):
+        for solver in ['curve_fit', 'batched']:
+            data = self.run_fitter(solver=solver)
+            data_continued = self.run_fitter(solver=solver, is_continued=True)
+            data_parallel = self.run_fitter(
+                solver=solver, is_continued=True, n_workers=2)
+            for k, v in data_continued.items():
+                if k.startswith('0/0/') and v.dtype.kind in 'fc':
+                    # Not warm-started
+                    self.assertTrue(
+                        np.array_equal(v, data[k], equal_nan=True), msg=k)
+                if k.endswith('nfev_s'):
+                    peaks = data_continued[k.replace('nfev_s', 'peaks_s')]
+                    self.assertTrue(
+                        np.array_equal(v > 0, np.isfinite(peaks)), msg=k)
+                if v.dtype.kind in 'fc':
+                    self.assertTrue(np.array_equal(
+                        v, data_parallel[k], equal_nan=True), msg=k)
+
+
+class TestSelectBetterFits(unittest.TestCase):
+    def test(self):
+        results = (
+            np.array([1.0, 2.0, 3.0]),
+            np.array([0.1, 0.2, 0.3]),
+            np.array([1.0, 1.0, 1.0]),
+            np.array([0.5, 0.5, 0.5]),
+            np.zeros((3, 4)),
+            np.array([10, 10, 10]),
+        )
+        results_other = (
+            np.array([1.5, 2.5, 3.5]),
+            np.array([0.15, 0.25, 0.35]),
+            np.array([1.0, 1.0, 1.0]),
+            np.array([0.4, 0.6, 0.4]),
+            np.ones((3, 4)),
+            np.array([7, 7, 7]),
+        )
+        is_compared = np.array([True, True, False])
+        selected = select_better_fits(results, results_other, is_compared)
+        self.assertTrue(np.array_equal(selected[0], [1.5, 2.0, 3.0]))
+        self.assertTrue(np.array_equal(selected[3], [0.4, 0.5, 0.5]))
+        self.assertTrue(np.array_equal(selected[4][:, 0], [1.0, 0.0, 0.0]))
+        self.assertTrue(np.array_equal(selected[5], [17, 17, 10]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from upho.analysis.smearing import Smearing
+
+
+class TestSmearing(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self._peaks = np.random.rand(12) * 8.0
+        self._weights = (
+            np.random.rand(2, 3, 12) + 1.0j * np.random.rand(2, 3, 12))
+
+    def test_run_kernel(self):
+        smearing = Smearing(xmin=-1.0, xmax=10.0, xpitch=0.01)
+        values = smearing.run(self._peaks, self._weights)
+        kernel = smearing.create_kernel(self._peaks)
+        for w in [self._weights, self._weights[0, 0]]:
+            values_kernel = smearing.run_kernel(kernel, w)
+            values_expected = smearing.run(self._peaks, w)
+            self.assertTrue(np.allclose(values_kernel, values_expected))
+        self.assertEqual(values.shape, (1101, 2, 3))
+
+    def test_cutoff(self):
+        cutoff = 8.0
+        smearing = Smearing(xmin=-1.0, xmax=10.0, xpitch=0.01)
+        smearing_banded = Smearing(
+            xmin=-1.0, xmax=10.0, xpitch=0.01, cutoff=cutoff)
+        for w in [self._weights, None]:
+            values = smearing.run(self._peaks, w)
+            values_banded = smearing_banded.run(self._peaks, w)
+            self.assertEqual(values.shape, values_banded.shape)
+            self.assertTrue(
+                np.all(np.abs(values - values_banded) < 1e-12))
+
+
+if __name__ == "__main__":
+    unittest.main()
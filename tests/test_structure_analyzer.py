@@ -0,0 +1,85 @@
+import unittest
+import os
+import numpy as np
+from phonopy.interface.vasp import read_vasp
+from phonopy.structure.cells import Supercell
+from upho.structure.structure_analyzer import StructureAnalyzer
+
+L21_DIR = os.path.join(os.path.dirname(__file__), 'L21_Cu3Au')
+
+
+def extract_mapping_brute_force(positions_old, positions_new, prec):
+    diff = positions_new[:, None, :] - positions_old[None, :, :]
+    wrapped_dpos = diff - np.rint(diff)
+    tmp, mapping = np.where(np.all(np.abs(wrapped_dpos) < prec, axis=2))
+    return mapping
+
+
+class TestStructureAnalyzer(unittest.TestCase):
+    def setUp(self):
+        unitcell = read_vasp(os.path.join(L21_DIR, 'POSCAR'))
+        self._atoms = Supercell(unitcell, np.diag([2, 2, 2]))
+        self._structure_analyzer = StructureAnalyzer(self._atoms)
+        self._prec = 1e-6
+
+    def test_extract_mapping_for_atoms(self):
+        symbols = self._atoms.get_chemical_symbols()
+        positions = self._atoms.get_scaled_positions()
+        rng = np.random.RandomState(0)
+        order = rng.permutation(len(positions))
+        # Positions are shifted by lattice vectors and slightly displaced,
+        # also across the boundaries of the cell.
+        positions_new = (
+            positions[order] +
+            rng.randint(-2, 3, size=positions.shape) +
+            rng.uniform(-0.5, 0.5, size=positions.shape) * self._prec)
+        positions_new[0] = positions[order[0]] - 1e-16
+        symbols_new = [symbols[i] for i in order]
+
+        mapping = self._structure_analyzer.extract_mapping_for_atoms(
+            symbols_new, positions_new, self._prec)
+        self.assertTrue(np.array_equal(mapping, order))
+        mapping_expected = extract_mapping_brute_force(
+            positions, positions_new, self._prec)
+        self.assertTrue(np.array_equal(mapping, mapping_expected))
+
+    def test_extract_mapping_for_atoms_failed(self):
+        symbols = self._atoms.get_chemical_symbols()
+        positions = self._atoms.get_scaled_positions()
+
+        positions_new = positions.copy()
+        positions_new[0] += 0.01
+        with self.assertRaises(ValueError):
+            self._structure_analyzer.extract_mapping_for_atoms(
+                symbols, positions_new, self._prec)
+
+        # The tolerance includes two atoms.
+        with self.assertRaises(ValueError):
+            self._structure_analyzer.extract_mapping_for_atoms(
+                symbols, positions, 0.3)
+
+        symbols_new = symbols[::-1]
+        with self.assertRaises(ValueError):
+            self._structure_analyzer.extract_mapping_for_atoms(
+                symbols_new, positions, self._prec)
+
+    def test_extract_mappings_for_symops(self):
+        structure_analyzer = self._structure_analyzer
+        dataset = structure_analyzer.get_symmetry_dataset()
+        rotations = dataset["rotations"]
+        translations = dataset["translations"]
+
+        mappings = structure_analyzer.extract_mappings_for_symops(
+            rotations, translations, self._prec)
+        self.assertEqual(mappings.shape, (len(rotations), 32))
+        for r, t, mapping in zip(rotations, translations, mappings):
+            mapping_expected = structure_analyzer.extract_mapping_for_symopr(
+                r, t, self._prec)
+            self.assertTrue(np.array_equal(mapping, mapping_expected))
+
+        self.assertTrue(np.array_equal(
+            structure_analyzer.get_mappings_for_symops(self._prec), mappings))
+
+
+if __name__ == "__main__":
+    unittest.main()
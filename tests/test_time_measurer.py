@@ -0,0 +1,46 @@
+import unittest
+from upho.analysis.time_measurer import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.measure('a'):
+            profiler.count('n')
+        self.assertEqual(profiler.get_data(), {'timings': {}, 'counters': {}})
+
+    def test_measure(self):
+        profiler = Profiler()
+        profiler.set_enabled(True)
+        for _ in range(3):
+            with profiler.measure('a'):
+                with profiler.measure('b'):
+                    pass
+                profiler.count('n', 2)
+        data = profiler.get_data()
+        self.assertEqual(sorted(data['timings']), ['a', 'a/b'])
+        self.assertEqual(data['timings']['a']['count'], 3)
+        self.assertEqual(data['timings']['a/b']['count'], 3)
+        self.assertGreaterEqual(
+            data['timings']['a']['total'], data['timings']['a/b']['total'])
+        self.assertEqual(data['counters'], {'n': 6})
+
+    def test_merge(self):
+        profiler = Profiler()
+        profiler.set_enabled(True)
+        with profiler.measure('a'):
+            profiler.count('n')
+        data = profiler.pop_data()
+        self.assertEqual(profiler.get_data(), {'timings': {}, 'counters': {}})
+
+        profiler.merge(data)
+        profiler.merge(data)
+        merged = profiler.get_data()
+        self.assertEqual(merged['timings']['a']['count'], 2)
+        self.assertAlmostEqual(
+            merged['timings']['a']['total'], 2 * data['timings']['a']['total'])
+        self.assertEqual(merged['counters'], {'n': 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -187,6 +187,24 @@ class TestTranslationalProjector(unittest.TestCase):
             np.abs(projected_eigvec - projected_eigvec_expected) < self._prec).all()
         self.assertTrue(is_same)
 
+    def test_partial(self):
+        eigvec = get_eigvec_2()
+        q = get_q_2()
+        indices = np.array([3, 4, 5, 9, 10, 11])
+
+        eigvec_masked = np.zeros_like(eigvec)
+        eigvec_masked[indices] = eigvec[indices]
+
+        translational_projector = self._translational_projector
+        projected_eigvec = translational_projector.project_vectors_partial(
+            eigvec[indices], indices, q)
+
+        projected_eigvec_expected = translational_projector.project_vectors(
+            eigvec_masked, q)
+        is_same = (
+            np.abs(projected_eigvec - projected_eigvec_expected) < self._prec).all()
+        self.assertTrue(is_same)
+
 
 class TestTranslationalProjectorFull(unittest.TestCase):
     """
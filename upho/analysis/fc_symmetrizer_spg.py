@@ -37,43 +37,59 @@ class FCSymmetrizerSPG(FCAnalyzerBase):
         print("nsym: {}".format(nsym))
         print("natoms: {}".format(natoms))
 
+        nsymbols = len(symboltypes)
+        symbol_indices = np.array([symboltypes.index(s) for s in symbols])
+
         fc_mean = np.zeros_like(fc_orig)
         fc_mean_square = np.zeros_like(fc_orig)
 
-        fc_mean_symbols, fc_mean_square_symbols, fc_std_symbols, counters = (
-            self.initialize_fc_symbols(fc_orig, symboltypes)
-        )
-
+        # Accumulators for the pairs of chemical symbols
+        shape_pairs = (nsymbols, nsymbols) + fc_orig.shape
+        fc_mean_pairs = np.zeros(shape_pairs)
+        fc_mean_square_pairs = np.zeros(shape_pairs)
+        counters_pairs = np.zeros(shape_pairs[:4], dtype=int)
+
+        # The elements for all (i1, i2) pairs are treated at once for each
+        # symmetry operation. Each (i1, i2) appears only once for each
+        # operation, and therefore the elements are accumulated in the same
+        # order as the loops over the atoms.
+        i1 = np.array(symmetry.get_independent_atoms())[:, None]
+        i2 = np.arange(natoms)[None, :]
         for (minv, r) in zip(mappings_inv, rotations_cart):
-            for i1 in symmetry.get_independent_atoms():
-                for i2 in range(natoms):
-                    j1 = minv[i1]
-                    j2 = minv[i2]
-                    s1 = symbols[j1]
-                    s2 = symbols[j2]
+            j1 = minv[i1]
+            j2 = minv[i2]
+            s1 = symbol_indices[j1]
+            s2 = symbol_indices[j2]
 
-                    tmp = np.dot(np.dot(r, fc_orig[j1, j2]), r.T)
-                    tmp2 = tmp ** 2
-                    fc_mean[i1, i2] += tmp
-                    fc_mean_square[i1, i2] += tmp2
+            tmp = rotate_tensors(fc_orig[j1, j2], r)
+            tmp2 = tmp ** 2
+            fc_mean[i1, i2] += tmp
+            fc_mean_square[i1, i2] += tmp2
 
-                    fc_mean_symbols[(s1, s2)][i1, i2] += tmp
-                    fc_mean_square_symbols[(s1, s2)][i1, i2] += tmp2
+            fc_mean_pairs[s1, s2, i1, i2] += tmp
+            fc_mean_square_pairs[s1, s2, i1, i2] += tmp2
 
-                    counters[(s1, s2)][i1, i2] += 1
+            counters_pairs[s1, s2, i1, i2] += 1
 
         fc_mean        /= float(len(rotations_cart))
         fc_mean_square /= float(len(rotations_cart))
 
-        for i1 in symmetry.get_independent_atoms():
-            for i2 in range(natoms):
-                for (key, c) in counters.items():
-                    if c[i1, i2] != 0:
-                        fc_mean_symbols       [key][i1, i2] /= c[i1, i2]
-                        fc_mean_square_symbols[key][i1, i2] /= c[i1, i2]
-                    else:
-                        fc_mean_symbols       [key][i1, i2] = np.nan
-                        fc_mean_square_symbols[key][i1, i2] = np.nan
+        c = counters_pairs[:, :, i1, i2][..., None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fc_mean_pairs[:, :, i1, i2] = np.where(
+                c != 0, fc_mean_pairs[:, :, i1, i2] / c, np.nan)
+            fc_mean_square_pairs[:, :, i1, i2] = np.where(
+                c != 0, fc_mean_square_pairs[:, :, i1, i2] / c, np.nan)
+
+        fc_mean_symbols = {}
+        fc_mean_square_symbols = {}
+        fc_std_symbols = {}
+        counters = {}
+        for (is1, is2) in itertools.product(range(nsymbols), repeat=2):
+            key = (symboltypes[is1], symboltypes[is2])
+            fc_mean_symbols       [key] = fc_mean_pairs       [is1, is2]
+            fc_mean_square_symbols[key] = fc_mean_square_pairs[is1, is2]
+            counters              [key] = counters_pairs      [is1, is2]
 
         ########################################
         # STD
@@ -129,17 +145,15 @@ class FCSymmetrizerSPG(FCAnalyzerBase):
         return fc_mean_symbols, fc_mean_square_symbols, fc_std_symbols, counters
 
     def distribute_force_constants_spg(self, fc, symmetry, rotations_cart, mappings):
-        fc_distributed = np.zeros_like(fc)
-        natoms = fc_distributed.shape[0]
         map_atoms = symmetry.get_map_atoms()
         map_operations = symmetry.get_map_operations()
-        for i in range(natoms):
-            i_equiv = map_atoms[i]
-            iop = map_operations[i]
-            r = rotations_cart[iop]
-            for j in range(natoms):
-                j_equiv = mappings[iop, j]
-                fc_distributed[i, j] = np.dot(np.dot(r.T, fc[i_equiv, j_equiv]), r)
+
+        # fc_distributed[i, j] = r_i^T . fc[map_atoms[i], mappings[iop_i, j]] . r_i
+        # where iop_i = map_operations[i] and r_i = rotations_cart[iop_i].
+        rotations = np.asarray(rotations_cart)[map_operations][:, None]
+        fc_equiv = fc[map_atoms[:, None], mappings[map_operations]]
+        fc_distributed = np.matmul(
+            np.matmul(np.swapaxes(rotations, -1, -2), fc_equiv), rotations)
 
         return fc_distributed
 
@@ -173,44 +187,46 @@ class FCSymmetrizerSPG(FCAnalyzerBase):
 
         shape = self._force_constants.shape
 
+        symbol_indices = np.array([symboltypes.index(s) for s in symbols])
+
         force_constants_symmetrized = np.zeros(shape)
         force_constants_sd = np.zeros(shape)
 
+        # Accumulators for the pairs of chemical symbols
+        shape_pairs = (nsymbols, nsymbols) + shape
+        fc_pairs = np.zeros(shape_pairs)
+        fc_pairs_sd = np.zeros(shape_pairs)
+        counters_pairs = np.zeros(shape_pairs[:4], dtype=int)
+
+        # i1, i2: indices after symmetry operations
+        # j1, j2: indices before symmetry operations
+        # Since "m" is a permutation, each (j1, j2) appears only once for each
+        # symmetry operation, and the scatter-add below accumulates the
+        # elements in the same order as the loops over the atoms.
+        s_i1 = symbol_indices[:, None]
+        s_i2 = symbol_indices[None, :]
+        for (m, r) in zip(mappings, rotations_cart):
+            j1 = m[:, None]
+            j2 = m[None, :]
+
+            tmp = rotate_tensors(self._force_constants, r)
+            tmp2 = tmp ** 2
+            force_constants_symmetrized[j1, j2] += tmp
+            force_constants_sd[j1, j2] += tmp2
+
+            fc_pairs[s_i1, s_i2, j1, j2] += tmp
+            fc_pairs_sd[s_i1, s_i2, j1, j2] += tmp2
+            counters_pairs[s_i1, s_i2, j1, j2] += 1
+
         force_constants_pair = {}
         force_constants_pair_sd = {}
         pair_counters = {}
-        for s1 in symboltypes:
-            for s2 in symboltypes:
-                force_constants_pair[(s1, s2)] = np.zeros(shape)
-                force_constants_pair_sd[(s1, s2)] = np.zeros(shape)
-                pair_counters[(s1, s2)] = np.zeros((natoms, natoms), dtype=int)
-
-        for (m, r) in zip(mappings, rotations_cart):
-            # i1, i2: indices after symmetry operations
-            # j1, j2: indices before symmetry operations
-            for i1 in range(natoms):
-                for i2 in range(natoms):
-                    j1 = m[i1]
-                    j2 = m[i2]
-                    s_i1 = symbols[i1]
-                    s_i2 = symbols[i2]
-                    s_j1 = symbols[j1]
-                    s_j2 = symbols[j2]
-
-                    tmp = np.dot(np.dot(r, self._force_constants[i1, i2]), r.T)
-                    tmp2 = tmp ** 2
-                    force_constants_symmetrized[j1, j2] += tmp
-                    force_constants_sd[j1, j2] += tmp2
-
-                    force_constants_pair[(s_i1, s_i2)][j1, j2] += tmp
-                    force_constants_pair_sd[(s_i1, s_i2)][j1, j2] += tmp2
-                    pair_counters[(s_i1, s_i2)][j1, j2] += 1
+        for (is1, is2) in itertools.product(range(nsymbols), repeat=2):
+            key = (symboltypes[is1], symboltypes[is2])
+            pair_counters[key] = counters_pairs[is1, is2]
 
         self._pair_counters = pair_counters
-        counter_check = np.zeros((natoms, natoms), dtype=int)
-        for (key, c) in pair_counters.items():
-            counter_check += c
-        self._counter_check = counter_check
+        self._counter_check = counters_pairs.sum(axis=(0, 1))
 
         force_constants_symmetrized /= float(nsym)
         force_constants_sd /= float(nsym)
@@ -218,18 +234,16 @@ class FCSymmetrizerSPG(FCAnalyzerBase):
             force_constants_symmetrized,
             force_constants_sd)
 
-        for (s_i1, s_i2) in itertools.product(symboltypes, repeat=2):
-            for (i1, i2) in itertools.product(range(natoms), repeat=2):
-                cval = pair_counters[(s_i1, s_i2)][i1, i2]
-                if cval != 0:
-                    force_constants_pair[(s_i1, s_i2)][i1, i2] /= cval
-                    force_constants_pair_sd[(s_i1, s_i2)][i1, i2] /= cval
-                else:
-                    force_constants_pair[(s_i1, s_i2)][i1, i2] = np.nan
-                    force_constants_pair_sd[(s_i1, s_i2)][i1, i2] = np.nan
-            force_constants_pair_sd[(s_i1, s_i2)] = get_matrix_std(
-                force_constants_pair[(s_i1, s_i2)],
-                force_constants_pair_sd[(s_i1, s_i2)])
+        c = counters_pairs[..., None, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fc_pairs = np.where(c != 0, fc_pairs / c, np.nan)
+            fc_pairs_sd = np.where(c != 0, fc_pairs_sd / c, np.nan)
+        fc_pairs_sd = get_matrix_std(fc_pairs, fc_pairs_sd)
+
+        for (is1, is2) in itertools.product(range(nsymbols), repeat=2):
+            key = (symboltypes[is1], symboltypes[is2])
+            force_constants_pair[key] = fc_pairs[is1, is2]
+            force_constants_pair_sd[key] = fc_pairs_sd[is1, is2]
 
         self._force_constants_symmetrized = force_constants_symmetrized
         self._force_constants_sd = force_constants_sd
@@ -314,6 +328,18 @@ class FCSymmetrizerSPG(FCAnalyzerBase):
                 f.write("{:4d}{:4d}{:8d}\n".format(i1, i2, c))
 
 
+def rotate_tensors(tensors, r):
+    """Rotate 3x3 tensors as r . tensor . r^T
+
+    Parameters
+    ----------
+    tensors : (..., 3, 3) array
+    r : (3, 3) array
+        Rotation matrix in Cartesian coordinates.
+    """
+    return np.matmul(np.matmul(r, tensors), r.T)
+
+
 def get_matrix_std(matrix_mean, matrix_mean_square):
     matrix_tmp = matrix_mean_square - matrix_mean ** 2
     matrix_std = np.sqrt(matrix_tmp)
@@ -30,6 +30,26 @@ def gaussian_unnormalized(x, position, width, norm):
     return norm * gaussian(x, position, width)
 
 
+def lorentzian_unnormalized_jacobian(x, position, width, norm):
+    """Derivatives of "lorentzian_unnormalized" w.r.t. position and width"""
+    dx = x - position
+    tmp = norm / (np.pi * (width ** 2 + dx ** 2) ** 2)
+    d_position = 2.0 * width * dx * tmp
+    d_width = (dx ** 2 - width ** 2) * tmp
+    return d_position, d_width
+
+
+def gaussian_unnormalized_jacobian(x, position, width, norm):
+    """Derivatives of "gaussian_unnormalized" w.r.t. position and width"""
+    factor = np.sqrt(2.0 * np.log(2.0))
+    sigma = width / factor
+    dx = x - position
+    values = gaussian_unnormalized(x, position, width, norm)
+    d_position = values * dx / sigma ** 2
+    d_width = values * (dx ** 2 / sigma ** 2 - 1.0) / sigma / factor
+    return d_position, d_width
+
+
 class FittingFunctionFactory(object):
     def __init__(self, name, is_normalized):
         """
@@ -57,3 +77,18 @@ class FittingFunctionFactory(object):
                 return gaussian_unnormalized
         else:
             raise ValueError('Unknown name', name)
+
+    def create_jacobian(self):
+        """Create the derivatives w.r.t. position and width
+
+        Only for the unnormalized functions with the norm fixed.
+        """
+        name = self._name
+        if self._is_normalized:
+            raise ValueError('Jacobian is only for unnormalized functions')
+        if name == 'lorentzian':
+            return lorentzian_unnormalized_jacobian
+        elif name == 'gaussian':
+            return gaussian_unnormalized_jacobian
+        else:
+            raise ValueError('Unknown name', name)
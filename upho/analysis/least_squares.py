@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+import numpy as np
+
+__author__ = 'Yuji Ikeda'
+
+
+def fit_peaks(function, jacobian, xs, ys, p0, norms, maxfev,
+              ftol=1.49012e-8, xtol=1.49012e-8, lambda0=1e-3):
+    """Fit many single peaks at once by the Levenberg-Marquardt method.
+
+    All the problems are solved simultaneously with the 2x2 normal
+    equations vectorized over the problems. Each problem stops
+    independently.
+
+    Parameters
+    ----------
+    function : Function
+        f(x, position, width, norm).
+    jacobian : Function
+        Returns the derivatives of "function" w.r.t. position and width.
+    xs : (nxs) array
+    ys : (nproblems, nxs) array
+        Data to be fitted.
+    p0 : (nproblems, 2) array
+        Initial positions and widths.
+    norms : (nproblems) array
+        Fixed norms of the peaks.
+    maxfev : Integer
+        Maximum number of function evaluations for each problem.
+    ftol : Float
+        Relative tolerance for the sum of squares.
+    xtol : Float
+        Relative tolerance for the parameters.
+        The default tolerances are the same as "scipy.optimize.curve_fit".
+
+    Returns
+    -------
+    params : (nproblems, 2) array
+        Fitted positions and widths.
+    nfev : (nproblems) array
+        Numbers of function evaluations.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    params = np.array(p0, dtype=float)
+    norms = np.asarray(norms, dtype=float)
+    nproblems = params.shape[0]
+
+    def evaluate(indices, params_trial):
+        values = function(
+            xs, params_trial[:, 0, None], params_trial[:, 1, None],
+            norms[indices, None])
+        residuals = values - ys[indices]
+        return residuals, np.sum(residuals ** 2, axis=1)
+
+    def differentiate(indices):
+        d_position, d_width = jacobian(
+            xs, params[indices, 0, None], params[indices, 1, None],
+            norms[indices, None])
+        return np.stack((d_position, d_width), axis=-1)
+
+    indices_all = np.arange(nproblems)
+    residuals, costs = evaluate(indices_all, params)
+    jacobians = differentiate(indices_all)  # (nproblems, nxs, 2)
+    lambdas = np.full(nproblems, lambda0)
+    nfev = np.ones(nproblems, dtype=int)
+
+    is_active = np.isfinite(costs)
+    while np.any(is_active):
+        indices = np.where(is_active)[0]
+        jac = jacobians[indices]
+        a = np.einsum('nxi,nxj->nij', jac, jac)
+        g = np.einsum('nxi,nx->ni', jac, residuals[indices])
+
+        diagonal = np.maximum(a[:, [0, 1], [0, 1]], np.finfo(float).tiny)
+        a_damped = a.copy()
+        a_damped[:, [0, 1], [0, 1]] += lambdas[indices, None] * diagonal
+        deltas = - solve_2x2(a_damped, g)
+        # Reduction of the sum of squares predicted by the linear model
+        reductions_predicted = - (
+            2.0 * np.einsum('ni,ni->n', g, deltas) +
+            np.einsum('ni,nij,nj->n', deltas, a, deltas))
+
+        params_old = params[indices]
+        params_trial = params_old + deltas
+        residuals_trial, costs_trial = evaluate(indices, params_trial)
+        nfev[indices] += 1
+
+        costs_old = costs[indices]
+        is_accepted = np.isfinite(costs_trial) & (costs_trial <= costs_old)
+        is_converged = (
+            (is_accepted &
+             (costs_old - costs_trial <= ftol * costs_old) &
+             (reductions_predicted <= ftol * costs_old)) |
+            (np.linalg.norm(deltas, axis=1) <=
+             xtol * (np.linalg.norm(params_old, axis=1) + xtol)))
+
+        accepted = indices[is_accepted]
+        params[accepted] = params_trial[is_accepted]
+        residuals[accepted] = residuals_trial[is_accepted]
+        costs[accepted] = costs_trial[is_accepted]
+        jacobians[accepted] = differentiate(accepted)
+        lambdas[accepted] *= 0.1
+        lambdas[indices[~is_accepted]] *= 10.0
+
+        is_active[indices[is_converged]] = False
+        is_active[nfev >= maxfev] = False
+        is_active[lambdas > 1e16] = False  # No more decrease is possible.
+
+    return params, nfev
+
+
+def solve_2x2(a, b):
+    """Solve 2x2 linear equations vectorized over the first axis
+
+    Singular equations give NaN, which is rejected in "fit_peaks".
+    """
+    det = a[:, 0, 0] * a[:, 1, 1] - a[:, 0, 1] * a[:, 1, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x0 = (a[:, 1, 1] * b[:, 0] - a[:, 0, 1] * b[:, 1]) / det
+        x1 = (a[:, 0, 0] * b[:, 1] - a[:, 1, 0] * b[:, 0]) / det
+    return np.stack((x0, x1), axis=-1)
@@ -5,6 +5,7 @@ from __future__ import absolute_import, division, print_function
 __author__ = "Yuji Ikeda"
 
 import numpy as np
+from scipy.sparse import csc_matrix
 from .functions import lorentzian
 
 
@@ -38,6 +39,34 @@ def histogram(x, positions, width):
     return tmp
 
 
+def gaussian_banded(xs, peaks, sigma, cutoff):
+    """Gaussian kernel evaluated only within "cutoff * sigma" of the peaks
+
+    Parameters
+    ----------
+    xs : (nxs) array
+        Must be sorted in ascending order.
+    peaks : (npeaks) array
+    sigma : Float
+    cutoff : Float
+        Cutoff in the unit of sigma.
+
+    Returns
+    -------
+    kernel : (nxs, npeaks) scipy.sparse.csc_matrix
+    """
+    if np.any(np.diff(xs) < 0.0):
+        raise ValueError('xs must be sorted for the banded evaluation.')
+    lower = np.searchsorted(xs, peaks - cutoff * sigma, side='left')
+    upper = np.searchsorted(xs, peaks + cutoff * sigma, side='right')
+    counts = upper - lower
+    indptr = np.concatenate(([0], np.cumsum(counts)))
+    rows = np.arange(indptr[-1]) - np.repeat(indptr[:-1] - lower, counts)
+    values = gaussian(xs[rows], np.repeat(peaks, counts), sigma)
+    return csc_matrix(
+        (values, rows, indptr), shape=(len(xs), len(peaks)))
+
+
 def create_points(xmin, xmax, xpitch):
     n = int(round((xmax - xmin) / xpitch)) + 1
     points = np.linspace(xmin, xmax, n)
@@ -50,11 +79,21 @@ class Smearing(object):
                  sigma=0.1,
                  xmin=None,
                  xmax=None,
-                 xpitch=None):
+                 xpitch=None,
+                 cutoff=None):
+        """
+
+        Parameters
+        ----------
+        cutoff : Float
+            If given for "gaussian", the kernel is evaluated only within
+            "cutoff * sigma" of each peak and stored as a sparse matrix.
+        """
 
         self._function_name = function_name
         self.set_smearing_function(function_name)
         self.set_sigma(sigma)
+        self._cutoff = cutoff
         if xmin is not None and xmax is not None and xpitch is not None:
             self.build_xs(xmin, xmax, xpitch)
         elif not (xmin is None and xmax is None and xpitch is None):
@@ -90,6 +129,41 @@ class Smearing(object):
     def get_function_name(self):
         return self._function_name
 
+    def get_cutoff(self):
+        return self._cutoff
+
+    def create_kernel(self, peaks):
+        """Create the kernel to be reused for several weights.
+
+        Returns
+        -------
+        kernel : (nxs, npeaks) array or scipy.sparse matrix
+        """
+        xs = self._xs
+        sigma = self._sigma
+
+        if self._cutoff is not None and self._function_name == "gaussian":
+            return gaussian_banded(xs, peaks, sigma, self._cutoff)
+        return self._smearing_function(xs[:, None], peaks[None, :], sigma)
+
+    def run_kernel(self, kernel, weights=None):
+        """Get smeared values from the kernel made by "create_kernel".
+
+        Args:
+            kernel:
+            weights:
+                Weight factors for "peaks".
+                The last dimension must have the same order as the "peaks".
+        """
+        if weights is None:
+            return np.asarray(kernel.sum(axis=1)).reshape(-1)
+        if isinstance(kernel, np.ndarray):
+            return np.inner(kernel, weights)
+        weights = np.asarray(weights)
+        tmp = weights.reshape(-1, weights.shape[-1]).T
+        values = kernel.dot(tmp)
+        return values.reshape((kernel.shape[0], ) + weights.shape[:-1])
+
     def run(self, peaks, weights=None):
         """Get smeared values.
 
@@ -100,14 +174,4 @@ class Smearing(object):
                 Now this can be one-dimeansional and multi-dimensional arrays.
                 The last dimension must have the same order as the "peaks".
         """
-        smearing_function = self._smearing_function
-        xs = self._xs
-        sigma = self._sigma
-
-        tmp = smearing_function(xs[:, None], peaks[None, :], sigma)
-        if weights is not None:
-            values = np.inner(tmp, weights)
-        else:
-            values = np.sum(tmp, axis=1)
-
-        return values
+        return self.run_kernel(self.create_kernel(peaks), weights)
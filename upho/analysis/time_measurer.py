@@ -5,7 +5,9 @@ from __future__ import (absolute_import, division,
 
 __author__ = "Yuji Ikeda"
 
+import json
 import time
+from contextlib import contextmanager
 
 
 class TimeMeasurer(object):
@@ -28,3 +30,109 @@ class TimeMeasurer(object):
         interval = self._finish - self._start
 
         print('{:36s} (sec.):  {:12.4f}'.format(time_string, interval))
+
+
+class Profiler(object):
+    """Hierarchical registry of timings and counters.
+
+    Timings are accumulated for the paths made of the names of the nested
+    "measure" blocks, e.g. "qpoint/eigh", and therefore aggregated over
+    q-points.  The data from worker processes are added by "merge".
+    Nothing is recorded unless enabled.
+    """
+    def __init__(self):
+        self._is_enabled = False
+        self._stack = []
+        self.reset()
+
+    def reset(self):
+        self._timings = {}
+        self._counters = {}
+
+    def set_enabled(self, is_enabled):
+        self._is_enabled = is_enabled
+
+    def is_enabled(self):
+        return self._is_enabled
+
+    @contextmanager
+    def measure(self, name):
+        if not self._is_enabled:
+            yield
+            return
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            interval = time.perf_counter() - start
+            self._stack.pop()
+            self._add_timing(path, 1, interval, interval)
+
+    def count(self, name, n=1):
+        if self._is_enabled:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def _add_timing(self, path, count, total, maximum):
+        if path not in self._timings:
+            self._timings[path] = {'count': 0, 'total': 0.0, 'max': 0.0}
+        timing = self._timings[path]
+        timing['count'] += count
+        timing['total'] += total
+        timing['max'] = max(timing['max'], maximum)
+
+    def get_data(self):
+        """
+
+        Returns
+        -------
+        data : dictionary
+            "timings": {path: {"count", "total", "max"}} in seconds.
+            "counters": {name: count}.
+        """
+        return {
+            'timings': {k: dict(v) for k, v in self._timings.items()},
+            'counters': dict(self._counters),
+        }
+
+    def pop_data(self):
+        """Get the data and reset the registry, e.g. in worker processes"""
+        data = self.get_data()
+        self.reset()
+        return data
+
+    def merge(self, data):
+        for path, timing in data['timings'].items():
+            self._add_timing(
+                path, timing['count'], timing['total'], timing['max'])
+        for name, n in data['counters'].items():
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def dumps(self):
+        return json.dumps(self.get_data(), indent=2, sort_keys=True)
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            f.write(self.dumps())
+            f.write('\n')
+
+    def write_hdf5_attrs(self, hdf5_object, name='profile'):
+        """Write the data as a JSON string into an HDF5 attribute"""
+        hdf5_object.attrs[name] = self.dumps()
+
+    def print_summary(self):
+        for path in sorted(self._timings):
+            timing = self._timings[path]
+            print('{:36s} (sec.):  {:12.4f} {:8d}'.format(
+                path, timing['total'], timing['count']))
+        for name in sorted(self._counters):
+            print('{:36s}        :  {:12d}'.format(name, self._counters[name]))
+
+
+# Registry shared in each process.
+_profiler = Profiler()
+
+
+def get_profiler():
+    return _profiler
@@ -1,15 +1,20 @@
+import logging
 import numpy as np
 from phonopy import Phonopy
 from phonopy.structure.symmetry import Symmetry
 from phonopy.structure.cells import (
     get_supercell, get_primitive, guess_primitive_matrix)
-from phonopy.harmonic.dynamical_matrix import DynamicalMatrix
 from phonopy.units import VaspToTHz
+from upho.harmonic.dynamical_matrix import UnfolderDynamicalMatrix
 from upho.phonon.band_structure import BandStructure
 from upho.phonon.single_point import SinglePoint
 from upho.phonon.mesh_unfolding import MeshUnfolding
 from upho.phonon.dos_unfolding import TotalDosUnfolding
 from .analysis.fc_symmetrizer_spg import FCSymmetrizerSPG
+from .analysis.time_measurer import get_profiler
+from .log import set_log_level
+
+logger = logging.getLogger(__name__)
 
 
 class PhonopyUnfolding(Phonopy):
@@ -33,14 +38,23 @@ class PhonopyUnfolding(Phonopy):
                  symprec=1e-5,
                  is_symmetry=True,
                  use_lapack_solver=False,
-                 log_level=0):
+                 log_level=0,
+                 cache_dir=None):
         self._symprec = symprec
+        # Directory to cache the arrays for the setup (None: not cached)
+        self._cache_dir = cache_dir
         self._distance = distance
         self._factor = factor
         self._is_auto_displacements = is_auto_displacements
         self._is_symmetry = is_symmetry
         self._use_lapack_solver = use_lapack_solver
         self._log_level = log_level
+        set_log_level(log_level)
+
+        # Timings and counters are recorded if log_level > 0.
+        profiler = get_profiler()
+        profiler.reset()
+        profiler.set_enabled(log_level > 0)
 
         # Create supercell and primitive cell
         self._unitcell = unitcell
@@ -49,7 +63,7 @@ class PhonopyUnfolding(Phonopy):
         self._primitive_matrix = None
         if type(primitive_matrix_ideal) is str and primitive_matrix_ideal == 'auto':
             self._primitive_matrix_ideal = self._guess_primitive_matrix()
-        elif primitive_matrix is not None:
+        elif primitive_matrix_ideal is not None:
             self._primitive_matrix_ideal = np.array(primitive_matrix_ideal,
                                               dtype='double', order='c')
         else:
@@ -125,15 +139,21 @@ class PhonopyUnfolding(Phonopy):
             factor=self._factor,
             star=self._star,
             mode=self._mode,
+            cache_dir=self._cache_dir,
             verbose=True)
 
     # Band structure
     def set_band_structure(self,
                            bands,
                            is_eigenvectors=False,
-                           is_band_connection=False):
+                           is_band_connection=False,
+                           n_workers=1,
+                           executor_class=None,
+                           weights_storage='full',
+                           hdf5_layout='groups',
+                           is_resumed=False):
         if self._dynamical_matrix is None:
-            print("Warning: Dynamical matrix has not yet built.")
+            logger.warning("Dynamical matrix has not yet built.")
             self._band_structure = None
             return False
 
@@ -148,6 +168,12 @@ class PhonopyUnfolding(Phonopy):
             factor=self._factor,
             star=self._star,
             mode=self._mode,
+            n_workers=n_workers,
+            executor_class=executor_class,
+            weights_storage=weights_storage,
+            hdf5_layout=hdf5_layout,
+            cache_dir=self._cache_dir,
+            is_resumed=is_resumed,
             verbose=True)
         return True
 
@@ -158,9 +184,12 @@ class PhonopyUnfolding(Phonopy):
                  is_time_reversal=True,
                  is_mesh_symmetry=True,
                  is_eigenvectors=False,
-                 is_gamma_center=False):
+                 is_gamma_center=False,
+                 n_workers=1,
+                 checkpoint_filename=None,
+                 is_resumed=False):
         if self._dynamical_matrix is None:
-            print("Warning: Dynamical matrix has not yet built.")
+            logger.warning("Dynamical matrix has not yet built.")
             self._mesh = None
             return False
 
@@ -180,7 +209,11 @@ class PhonopyUnfolding(Phonopy):
             rotations=self._primitive_symmetry.get_pointgroup_operations(),
             factor=self._factor,
             use_lapack_solver=self._use_lapack_solver,
-            mode=self._mode)
+            mode=self._mode,
+            n_workers=n_workers,
+            cache_dir=self._cache_dir,
+            checkpoint_filename=checkpoint_filename,
+            is_resumed=is_resumed)
         return True
 
     # DOS
@@ -192,8 +225,8 @@ class PhonopyUnfolding(Phonopy):
                       tetrahedron_method=False):
 
         if self._mesh is None:
-            print("Warning: \'set_mesh\' has to finish correctly "
-                  "before DOS calculation.")
+            logger.warning("\'set_mesh\' has to finish correctly "
+                           "before DOS calculation.")
             self._total_dos = None
             return False
 
@@ -210,21 +243,24 @@ class PhonopyUnfolding(Phonopy):
         self._dynamical_matrix = None
 
         if self._supercell is None or self._primitive is None:
-            print("Bug: Supercell or primitive is not created.")
+            logger.error("Bug: Supercell or primitive is not created.")
             return False
         elif self._force_constants is None:
-            print("Warning: Force constants are not prepared.")
+            logger.warning("Force constants are not prepared.")
             return False
         elif self._primitive.get_masses() is None:
-            print("Warning: Atomic masses are not correctly set.")
+            logger.warning("Atomic masses are not correctly set.")
             return False
         else:
             if self._nac_params is None:
-                self._dynamical_matrix = DynamicalMatrix(
-                    self._supercell,
-                    self._primitive,
-                    self._force_constants,
-                    decimals=self._dynamical_matrix_decimals)
+                with get_profiler().measure('setup_dynamical_matrix'):
+                    self._dynamical_matrix = UnfolderDynamicalMatrix(
+                        self._supercell,
+                        self._primitive,
+                        self._force_constants,
+                        decimals=self._dynamical_matrix_decimals,
+                        symprec=self._symprec,
+                        cache_dir=self._cache_dir)
             else:
                 raise ValueError(
                     'Currently NAC is not available for unfolding.')
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Setup shared by the scripts running the unfolding
+
+"upho_weights" and "run_separation" use these functions to parse the
+common options, to read the structures and the force constants, and to
+build "PhonopyUnfolding".
+"""
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+from pprint import pprint
+import phonopy.file_IO as file_IO
+from phonopy.interface.calculator import read_crystal_structure
+from phonopy.phonon.band_structure import get_band_qpoints
+from phonopy.units import VaspToTHz
+from upho.api_unfolding import PhonopyUnfolding
+from upho.file_io import read_input
+from upho.analysis.time_measurer import get_profiler
+from upho.log import get_log_level
+
+
+def get_default_dict_input():
+    """
+    star :
+        type=str
+        choices=("none", "all", "sym")
+        help="Treatment for the star of q-points."
+    """
+    default_dict_input = {
+        "structure"      : "POSCAR",
+        "structure_ideal": "POSCAR_ideal",
+        "force_constants": "FORCE_CONSTANTS",
+        "run_mode"       : "band",
+        "star"           : "sym",
+        "projection"     : "eigenvectors",
+    }
+    return default_dict_input
+
+
+def add_unfolding_arguments(parser):
+    """Add the options shared by the scripts running the unfolding
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+    """
+    parser.add_argument("--tolerance", dest="symprec",
+                        default=1e-5,
+                        type=float,
+                        help="Symmetry tolerance to search")
+    parser.add_argument("-i", "--input_file",
+                        type=str,
+                        help="Input file for unfolding.")
+    parser.add_argument("--average_masses",
+                        action="store_true",
+                        help="Atomic masses are averaged.")
+    parser.add_argument("--average_force_constants",
+                        action="store_true",
+                        help="Force constants are averaged according to "
+                             "the ideal crystallographic symmetry.")
+    parser.add_argument("--nprocs", dest="n_workers",
+                        default=1,
+                        type=int,
+                        help="Number of processes sharing q-points.")
+    parser.add_argument("--weights_storage",
+                        default="full",
+                        choices=["full", "packed"],
+                        help="Storage of weights for pairs of chemical "
+                             "elements in band.hdf5.")
+    parser.add_argument("--hdf5_layout",
+                        default="groups",
+                        choices=["groups", "consolidated"],
+                        help="Layout of band.hdf5. \"consolidated\" writes "
+                             "one compressed dataset for each quantity.")
+    parser.add_argument("--profile",
+                        dest="profile_filename",
+                        type=str,
+                        help="JSON file to write the timings and counters "
+                             "of the run.")
+    parser.add_argument("--cache_dir",
+                        type=str,
+                        help="Directory to cache the symmetry and mapping "
+                             "arrays for the setup among runs.")
+    parser.add_argument("--resume",
+                        dest="is_resumed",
+                        action="store_true",
+                        help="Compute only q-points not completed in "
+                             "band.hdf5 and mesh_checkpoint.hdf5 to "
+                             "continue an interrupted run.")
+    parser.add_argument("-v", "--verbose",
+                        action="store_true",
+                        help="Write details including arrays for each "
+                             "q-point.")
+    parser.add_argument("-q", "--quiet",
+                        action="store_true",
+                        help="Write only warnings.")
+    parser.add_argument("conf_file",
+                        type=str,
+                        help="Phonopy conf file")
+
+
+def read_dict_input(input_file=None):
+    """Read the input file for unfolding over the default values"""
+    dict_input = get_default_dict_input()
+    if input_file is not None:
+        dict_input.update(read_input(input_file))
+
+    print("=" * 40)
+    print("dict_input:")
+    pprint(dict_input)
+    print("=" * 40)
+
+    return dict_input
+
+
+def create_phonon_unfolding(args, dict_input, supercell_matrix,
+                            primitive_matrix, factor=VaspToTHz):
+    """Read the structures and the force constants and build the unfolding
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed with the options of "add_unfolding_arguments".
+    dict_input : dictionary
+        Obtained by "read_dict_input".
+    supercell_matrix : (3, 3) array
+    primitive_matrix : (3, 3) array or "auto"
+        Primitive matrix for the ideal unit cell.
+
+    Returns
+    -------
+    phonon : PhonopyUnfolding
+        With the force constants set (and averaged if requested).
+    """
+    star = dict_input["star"]
+    projection = dict_input["projection"]
+    print("star:", star)
+    print('projection:', projection)
+
+    fc_filename = dict_input["force_constants"]
+    print("fc_filename:", fc_filename)
+    fc = file_IO.parse_FORCE_CONSTANTS(fc_filename)
+
+    unitcell = read_crystal_structure(dict_input["structure"])[0]
+    unitcell_ideal = read_crystal_structure(dict_input["structure_ideal"])[0]
+
+    print("supercell_matrix:")
+    print(supercell_matrix)
+    print("primitive_matrix:")
+    print(primitive_matrix)
+
+    phonon = PhonopyUnfolding(unitcell,
+                              unitcell_ideal,
+                              supercell_matrix,
+                              primitive_matrix,
+                              factor=factor,
+                              star=star,
+                              mode=projection,
+                              symprec=args.symprec,
+                              log_level=get_log_level(args),
+                              cache_dir=args.cache_dir)
+
+    # The profiler is enabled only for log_level > 0 by PhonopyUnfolding.
+    if args.profile_filename is not None:
+        get_profiler().set_enabled(True)
+
+    if args.average_masses:
+        phonon.average_masses()
+        print('Atomic masses are averaged.')
+
+    phonon.set_force_constants(fc)
+
+    if args.average_force_constants:
+        phonon.average_force_constants()
+        print('Force constants are averaged according to '
+              'the ideal crystallographic symmetry.')
+
+    return phonon
+
+
+def create_bands(settings):
+    """Create q-points on the band paths of the phonopy settings"""
+    npoints = settings.get_band_points()
+    if npoints is None:
+        npoints = 51  # default value inherited from phonopy
+    return get_band_qpoints(settings.get_band_paths(), npoints)
+
+
+def write_profile(args):
+    """Print and write the timings and counters if they are recorded"""
+    profiler = get_profiler()
+    if profiler.is_enabled():
+        if get_log_level(args) > 0:
+            profiler.print_summary()
+        if args.profile_filename is not None:
+            profiler.write_json(args.profile_filename)
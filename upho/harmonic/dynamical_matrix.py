@@ -1,6 +1,8 @@
+import itertools
 import numpy as np
 from phonopy.structure.cells import get_reduced_bases
 from phonopy.harmonic.dynamical_matrix import DynamicalMatrix
+from upho.structure.setup_cache import get_cached_arrays
 
 
 class UnfolderDynamicalMatrix(DynamicalMatrix):
@@ -25,25 +27,148 @@ class UnfolderDynamicalMatrix(DynamicalMatrix):
                  primitive,
                  force_constants,
                  decimals=None,
-                 symprec=1e-5):
+                 symprec=1e-5,
+                 cache_dir=None):
+        """
+
+        cache_dir:
+            Directory to cache the smallest vectors.  Not cached if None.
+        """
         self._scell = supercell
         self._pcell = primitive
-        self._force_constants = np.array(force_constants,
-                                         dtype='double', order='C')
         self._decimals = decimals
         self._symprec = symprec
+        self._dynamical_matrix = None
+        self._force_constants = None
+        self._set_force_constants(force_constants)
+
+        itemsize = self._force_constants.itemsize
+        self._dtype_complex = ("c%d" % (itemsize * 2))
 
         self._p2s_map = primitive.get_primitive_to_supercell_map()
         self._s2p_map = primitive.get_supercell_to_primitive_map()
         p2p_map = primitive.get_primitive_to_primitive_map()
-        self._p2p_map = [p2p_map[self._s2p_map[i]]
-                         for i in range(len(self._s2p_map))]
-        self._smallest_vectors, self._multiplicity = \
-            get_smallest_vectors(supercell, primitive, symprec)
+        self._s2pp_map = np.array(
+            [p2p_map[self._s2p_map[i]] for i in range(len(self._s2p_map))],
+            dtype='intc')
+        self._p2p_map = self._s2pp_map
+        self._set_smallest_vectors(cache_dir)
         self._mass = self._pcell.get_masses()
         # Non analytical term correction
         self._nac = False
 
+        self._create_compressed_table()
+
+    def _set_smallest_vectors(self, cache_dir):
+        def create_arrays():
+            smallest_vectors, multiplicity = get_smallest_vectors(
+                self._scell, self._pcell, self._symprec)
+            return {'smallest_vectors': smallest_vectors,
+                    'multiplicity': multiplicity}
+
+        items = [self._scell, self._pcell, self._symprec]
+        arrays = get_cached_arrays(
+            cache_dir, 'smallest_vectors', items, create_arrays)
+        self._smallest_vectors = arrays['smallest_vectors']
+        self._multiplicity = arrays['multiplicity']
+
+    def _create_compressed_table(self):
+        """Create the table of (pair, multiplicity, vector) used for all q
+
+        Pairs are made of an atom "i" in the primitive cell and an atom "k"
+        in the supercell, and they are ordered as (i, j, c), where "j" is
+        the atom in the primitive cell corresponding to "k" and "c" is the
+        index of the lattice point.  Each pair has "multiplicity" vectors,
+        which are flattened into one array.
+        """
+        fc = self._force_constants
+        mass = self._mass
+        multiplicity = self._multiplicity
+        natoms_p = len(self._p2s_map)
+
+        # (natoms_p, ncells) array of atom indices in the supercell
+        s_indices = np.array(
+            [np.where(self._s2pp_map == j)[0] for j in range(natoms_p)])
+        ncells = s_indices.shape[1]
+
+        i_indices = np.repeat(np.arange(natoms_p), natoms_p * ncells)
+        k_indices = np.tile(s_indices.ravel(), natoms_p)
+        j_indices = self._s2pp_map[k_indices]
+
+        if fc.shape[0] == fc.shape[1]:  # full FC
+            fc_pairs = fc[self._p2s_map[i_indices], k_indices]
+        else:
+            fc_pairs = fc[i_indices, k_indices]
+        sqrt_mm = np.sqrt(mass[i_indices] * mass[j_indices])
+        fc_pairs = fc_pairs / sqrt_mm[:, None, None]
+
+        multi = multiplicity[k_indices, i_indices]
+        pair_indices = np.repeat(np.arange(len(multi)), multi)
+        l_indices = np.arange(len(pair_indices)) - np.repeat(
+            np.cumsum(multi) - multi, multi)
+
+        self._table_vectors = self._smallest_vectors[
+            k_indices[pair_indices], i_indices[pair_indices], l_indices]
+        self._table_weights = 1.0 / multi[pair_indices]
+        self._table_offsets = np.cumsum(multi) - multi
+        # (natoms_p, natoms_p, ncells, 3, 3)
+        self._table_fc = fc_pairs.reshape(natoms_p, natoms_p, ncells, 3, 3)
+
+    def _set_dynamical_matrix(self, q):
+        self._dynamical_matrix = self._create_dynamical_matrices([q])[0]
+
+    def get_dynamical_matrices(self, qpoints):
+        """Get dynamical matrices at many q-points at once
+
+        Parameters
+        ----------
+        qpoints : (nqpoints, 3) array
+            Reciprocal space points in fractional coordinates for the
+            primitive cell of this dynamical matrix.
+
+        Returns
+        -------
+        dms : (nqpoints, natoms_p * 3, natoms_p * 3) array
+        """
+        dms = self._create_dynamical_matrices(qpoints)
+        if self._decimals is None:
+            return dms
+        else:
+            return dms.round(decimals=self._decimals)
+
+    def _create_dynamical_matrices(self, qpoints, max_size=2 ** 24):
+        qpoints = np.array(qpoints, dtype='double').reshape(-1, 3)
+        natoms_p, ncells = self._table_fc.shape[1:3]
+        nqpoints = len(qpoints)
+        nvectors = len(self._table_vectors)
+
+        # q-points are divided into chunks to limit the size of phases.
+        nchunk = max(1, max_size // max(1, nvectors))
+        dms = []
+        for iq in range(0, nqpoints, nchunk):
+            phases = np.exp(2j * np.pi * np.dot(
+                qpoints[iq:iq + nchunk], self._table_vectors.T))
+            phases *= self._table_weights
+            phase_factors = np.add.reduceat(
+                phases, self._table_offsets, axis=1)
+            phase_factors = phase_factors.reshape(
+                -1, natoms_p, natoms_p, ncells).transpose(1, 2, 0, 3)
+
+            # (natoms_p, natoms_p, nqpoints, 9)
+            tmp = np.matmul(
+                phase_factors,
+                self._table_fc.reshape(natoms_p, natoms_p, ncells, 9))
+            tmp = tmp.reshape(natoms_p, natoms_p, -1, 3, 3)
+            dm = tmp.transpose(2, 0, 3, 1, 4).reshape(
+                -1, natoms_p * 3, natoms_p * 3)
+            dms.append(dm)
+        dms = np.concatenate(dms).astype(self._dtype_complex)
+
+        # Impose Hermisian condition
+        dms = (dms + np.conj(np.swapaxes(dms, -2, -1))) / 2
+
+        return dms
+
 
 # Helper methods
 def get_equivalent_smallest_vectors_np(
@@ -86,7 +211,7 @@ def get_equivalent_smallest_vectors_np(
     return smallest_vectors
 
 
-def get_smallest_vectors(supercell, primitive, symprec):
+def get_smallest_vectors(supercell, primitive, symprec, max_size=2 ** 22):
     """
     shortest_vectors:
 
@@ -101,23 +226,58 @@ def get_smallest_vectors(supercell, primitive, symprec):
     multiplicity:
       Number of multiple shortest vectors (third index of "shortest_vectors")
       [atom_super, atom_primitive]
-    """
 
+    The reduced bases and the positions are computed only once, and the 27
+    images for all the pairs are evaluated at once.  Atoms in supercell are
+    divided into chunks so that the number of the evaluated vectors does not
+    exceed "max_size".
+    """
     p2s_map = primitive.get_primitive_to_supercell_map()
     size_super = supercell.get_number_of_atoms()
     size_prim = primitive.get_number_of_atoms()
     shortest_vectors = np.zeros((size_super, size_prim, 27, 3), dtype='double')
     multiplicity = np.zeros((size_super, size_prim), dtype='intc')
 
-    for i in range(size_super):  # run in supercell
-        for j, s_j in enumerate(p2s_map):  # run in primitive
-            vectors = get_equivalent_smallest_vectors_np(i,
-                                                      s_j,
-                                                      supercell,
-                                                      primitive.get_cell(),
-                                                      symprec)
-            multiplicity[i][j] = len(vectors)
-            for k, elem in enumerate(vectors):
-                shortest_vectors[i][j][k] = elem
+    reduced_bases = get_reduced_bases(supercell.get_cell(), symprec)
+    positions = np.dot(supercell.get_positions(), np.linalg.inv(reduced_bases))
+
+    # Atomic positions are confined into the lattice made of reduced bases.
+    positions -= np.rint(positions)
+
+    relative_scale = np.dot(reduced_bases,
+                            np.linalg.inv(primitive.get_cell()))
+
+    # The 1st index moves the slowest as in "get_equivalent_smallest_vectors_np".
+    lattice_points = np.array(
+        list(itertools.product([-1, 0, 1], repeat=3)), dtype='double')
+
+    p_pos = positions[p2s_map]
+    nchunk = max(1, max_size // (size_prim * 27))
+    for i0 in range(0, size_super, nchunk):
+        s_pos = positions[i0:i0 + nchunk]
+        # The vector arrow is from the atom in primitive to
+        # the atom in supercell cell plus a supercell lattice
+        # point. This is related to determine the phase
+        # convension when building dynamical matrix.
+        differences = (s_pos[:, None, None, :]
+                       + lattice_points[None, None, :, :]
+                       - p_pos[None, :, None, :])
+        vecs = np.dot(differences, reduced_bases)
+        distances = np.linalg.norm(vecs, axis=-1)
+
+        minimum = np.min(distances, axis=-1)
+        is_smallest = np.abs(minimum[..., None] - distances) < symprec
+
+        # Smallest vectors are moved to the front keeping their order.
+        order = np.argsort(~is_smallest, axis=-1, kind='stable')
+        differences = np.take_along_axis(differences, order[..., None], axis=2)
+        is_smallest = np.take_along_axis(is_smallest, order, axis=2)
+
+        tmp = np.dot(differences.reshape(-1, 3), relative_scale)
+        tmp = tmp.reshape(differences.shape)
+        tmp[~is_smallest] = 0.0
+
+        shortest_vectors[i0:i0 + nchunk] = tmp
+        multiplicity[i0:i0 + nchunk] = np.sum(is_smallest, axis=-1)
 
     return shortest_vectors, multiplicity
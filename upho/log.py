@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import logging
+import sys
+
+# Parent of the loggers "logging.getLogger(__name__)" in the modules.
+LOGGER_NAME = 'upho'
+
+# "log_level" as in phonopy:
+# 0: Only warnings.
+# 1: Progress summaries, e.g. one line for each q-point.
+# 2: Details including arrays for each q-point.
+LOG_LEVELS = {
+    0: logging.WARNING,
+    1: logging.INFO,
+    2: logging.DEBUG,
+}
+
+
+def set_log_level(log_level):
+    """Set the verbosity of the messages from upho written to stdout
+
+    Messages below the level are not formatted at all, and therefore
+    large arrays cost nothing unless "log_level" is 2.
+
+    Parameters
+    ----------
+    log_level : Integer
+        0, 1, or 2. Larger values are regarded as 2.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(LOG_LEVELS[min(max(log_level, 0), 2)])
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def get_log_level(args):
+    """Get "log_level" from the "--verbose" and "--quiet" options of scripts"""
+    if args.quiet:
+        return 0
+    if args.verbose:
+        return 2
+    return 1
+
+
+def log_point(logger, group, npoints):
+    """Log the point "{ipath}/{ip}/" finished in detail and each path briefly
+
+    Parameters
+    ----------
+    logger : logging.Logger
+    group : String
+        "{ipath}/{ip}/"
+    npoints : Integer
+        The number of points on each path.
+    """
+    logger.debug(group)
+    ipath, ip = (int(x) for x in group.split('/')[:2])
+    if ip == npoints - 1:
+        logger.info('Path %d (%d points) finished.', ipath, npoints)
@@ -2,14 +2,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
-import h5py
+import logging
 import numpy as np
 from phonopy.units import VaspToTHz
 from phonopy.structure.cells import get_primitive
-from upho.phonon.eigenstates import Eigenstates
+from upho.phonon.eigenstates import Eigenstates, write_data_dict
+from upho.phonon.parallel import extract_eigenstates_data
+from upho.phonon.hdf5_layout import ConsolidatedWriter, is_point_completed
+from upho.phonon.checkpoint import create_input_hash, open_hdf5_file
+from upho.analysis.time_measurer import get_profiler
 
 __author__ = 'Yuji Ikeda'
 
+logger = logging.getLogger(__name__)
+
 
 class BandStructure(object):
     def __init__(self,
@@ -23,6 +29,12 @@ class BandStructure(object):
                  factor=VaspToTHz,
                  star="none",
                  mode="eigenvector",
+                 n_workers=1,
+                 executor_class=None,
+                 weights_storage='full',
+                 hdf5_layout='groups',
+                 cache_dir=None,
+                 is_resumed=False,
                  verbose=False):
         """
 
@@ -31,6 +43,26 @@ class BandStructure(object):
                 Dynamical matrix for the (disordered) supercell.
             primitive_ideal_wrt_unitcell:
                 Primitive cell w.r.t. the unitcell (not the supercell).
+            n_workers:
+                The number of worker processes to share q-points.
+                If 1, q-points are computed in the present process.
+            executor_class:
+                Executor for the workers with the same signature as
+                "ProcessPoolExecutor". See "extract_eigenstates_data".
+            weights_storage:
+                "full" or "packed" for the weights for pairs of
+                (atom, element). See "write_data_dict".
+            hdf5_layout:
+                "groups" writes one group "{ipath}/{ip}/" for each point.
+                "consolidated" writes one chunked and compressed dataset
+                for each quantity with the leading (ipath, ip) axes.
+            cache_dir:
+                Directory to cache the arrays for the setup.
+                Not cached if None.
+            is_resumed:
+                If True and "band.hdf5" exists, only the points not
+                completed in the file are computed. The file must have
+                been made with the same inputs.
         """
         # ._dynamical_matrix must be assigned for calculating DOS
         # using the tetrahedron method.
@@ -59,19 +91,37 @@ class BandStructure(object):
 
         self._star = star
         self._mode = mode
-
-        self._eigenstates = Eigenstates(
-            dynamical_matrix,
-            unitcell_ideal,
-            primitive_matrix_ideal,
-            mode=mode,
-            star=star,
-            verbose=verbose)
-
-        with h5py.File('band.hdf5', 'w') as f:
+        self._n_workers = n_workers
+        self._executor_class = executor_class
+        self._weights_storage = weights_storage
+        if hdf5_layout not in ('groups', 'consolidated'):
+            raise ValueError('Unknown hdf5_layout: {}'.format(hdf5_layout))
+        self._hdf5_layout = hdf5_layout
+
+        self._eigenstates_kwargs = {
+            'dynamical_matrix': dynamical_matrix,
+            'unitcell_ideal': unitcell_ideal,
+            'primitive_matrix_ideal': primitive_matrix_ideal,
+            'mode': mode,
+            'star': star,
+            'cache_dir': cache_dir,
+            'verbose': verbose,
+        }
+        if n_workers == 1:
+            self._eigenstates = Eigenstates(**self._eigenstates_kwargs)
+
+        input_hash = create_input_hash(
+            self._eigenstates_kwargs,
+            [np.array(self._paths), weights_storage, hdf5_layout])
+        f, is_new = open_hdf5_file('band.hdf5', input_hash, is_resumed)
+        with f:
             self._hdf5_file = f
-            self._write_hdf5_header()
+            if is_new:
+                self._write_hdf5_header()
             self._set_band(verbose=verbose)
+            profiler = get_profiler()
+            if profiler.is_enabled():
+                profiler.write_hdf5_attrs(f)
 
     def _write_hdf5_header(self):
         self._hdf5_file.create_dataset('paths', data=self._paths)
@@ -86,28 +136,70 @@ class BandStructure(object):
         self._lastq = qpoint.copy()
 
     def _set_band(self, verbose=False):
+        if self._dynamical_matrix.is_nac():
+            raise ValueError('NAC is not implemented yet for unfolding')
+
+        indices = []
+        qpoints = []
+        distances = []
         for ipath, path in enumerate(self._paths):
             self._set_initial_point(path[0])
-            self._solve_dm_on_path(ipath, path, verbose)
+            for ip, q in enumerate(path):
+                self._shift_point(q)
+                indices.append((ipath, ip))
+                qpoints.append(q)
+                distances.append(self._distance)
 
             self._special_point.append(self._distance)
 
-    def _solve_dm_on_path(self, ipath, path, verbose):
+        # Points completed before the run was interrupted are skipped.
+        npoints_all = len(indices)
+        points = [
+            (index, q, distance)
+            for index, q, distance in zip(indices, qpoints, distances)
+            if not is_point_completed(self._hdf5_file, *index)]
+        if len(points) < npoints_all:
+            logger.info('%d of %d points are already completed.',
+                        npoints_all - len(points), npoints_all)
+        indices, qpoints, distances = (
+            [list(x) for x in zip(*points)] if points else ([], [], []))
+
+        if self._n_workers == 1:
+            data_dicts = self._solve_dm_on_points(qpoints, distances)
+        else:
+            data_dicts = extract_eigenstates_data(
+                self._eigenstates_kwargs, qpoints, distances, self._n_workers,
+                executor_class=self._executor_class)
+
+        profiler = get_profiler()
+        if self._hdf5_layout == 'consolidated':
+            npaths, npoints = np.shape(self._paths)[:2]
+            writer = ConsolidatedWriter(
+                self._hdf5_file, npaths, npoints,
+                weights_storage=self._weights_storage)
+            for (ipath, ip), data_dict in zip(indices, data_dicts):
+                with profiler.measure('hdf5_write'):
+                    writer.write(ipath, ip, data_dict)
+                    self._hdf5_file.flush()
+            with profiler.measure('hdf5_write'):
+                writer.close()
+        else:
+            for (ipath, ip), data_dict in zip(indices, data_dicts):
+                group = '{}/{}/'.format(ipath, ip)
+                with profiler.measure('hdf5_write'):
+                    if group in self._hdf5_file:  # Incomplete data
+                        del self._hdf5_file[group]
+                    write_data_dict(self._hdf5_file, data_dict, group=group,
+                                    weights_storage=self._weights_storage)
+                    self._hdf5_file[group].attrs['completed'] = True
+                    self._hdf5_file.flush()
+
+    def _solve_dm_on_points(self, qpoints, distances):
         eigenstates = self._eigenstates
-
-        is_nac = self._dynamical_matrix.is_nac()
-
-        for ip, q in enumerate(path):
-            self._shift_point(q)
-
-            if is_nac:
-                raise ValueError('NAC is not implemented yet for unfolding')
-
-            eigenstates.set_distance(self._distance)
+        for q, distance in zip(qpoints, distances):
+            eigenstates.set_distance(distance)
             eigenstates.extract_eigenstates(q)
-
-            group = '{}/{}/'.format(ipath, ip)
-            eigenstates.write_hdf5(self._hdf5_file, group=group)
+            yield eigenstates.get_data_dict()
 
     def get_unitcell_orig(self):
         unitcell_orig = self._dynamical_matrix.get_primitive()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import os
+import h5py
+from upho.structure.setup_cache import create_hash
+
+# Attribute of the root of the output files to check the inputs when resumed.
+INPUT_HASH_KEY = 'input_hash'
+
+# Keyword arguments of "Eigenstates" which do not change the results.
+IGNORED_KWARGS = ('dynamical_matrix', 'cache_dir', 'verbose')
+
+
+def create_input_hash(eigenstates_kwargs, items=()):
+    """Create the hash of the inputs determining the results for q-points
+
+    Parameters
+    ----------
+    eigenstates_kwargs : dictionary
+        Keyword arguments to build "Eigenstates".
+        The supercell, the primitive cell, the masses, and the force
+        constants are taken from the dynamical matrix.
+    items : List
+        Other items determining the results, e.g. the q-points.
+    """
+    dynamical_matrix = eigenstates_kwargs['dynamical_matrix']
+    primitive = dynamical_matrix.get_primitive()
+    hash_items = [
+        dynamical_matrix.get_supercell(),
+        primitive,
+        primitive.get_masses(),
+        dynamical_matrix.get_force_constants(),
+    ]
+    for k in sorted(eigenstates_kwargs):
+        if k not in IGNORED_KWARGS:
+            hash_items += [k, eigenstates_kwargs[k]]
+    return create_hash(hash_items + list(items))
+
+
+def open_hdf5_file(filename, input_hash, is_resumed=False):
+    """Open the HDF5 file to write the results for q-points
+
+    If "is_resumed" and the file exists, the file is opened in the append
+    mode to continue an interrupted run.  Otherwise, a new file is created.
+
+    Parameters
+    ----------
+    filename : String
+    input_hash : String
+        Obtained by "create_input_hash".
+    is_resumed : Bool
+
+    Returns
+    -------
+    hdf5_file : HDF5 file object
+    is_new : Bool
+        True if the file is newly created.
+
+    Raises
+    ------
+    ValueError
+        If the existing file has no input hash or was made with different
+        inputs.
+    """
+    if is_resumed and os.path.isfile(filename):
+        hdf5_file = h5py.File(filename, 'a')
+        if INPUT_HASH_KEY not in hdf5_file.attrs:
+            hdf5_file.close()
+            raise ValueError(
+                '{} has no "{}" attribute, e.g. written by an older version, '
+                'and cannot be resumed. Remove it or run without '
+                'resuming.'.format(filename, INPUT_HASH_KEY))
+        if hdf5_file.attrs[INPUT_HASH_KEY] != input_hash:
+            hdf5_file.close()
+            raise ValueError(
+                '{} was made with different inputs and cannot be '
+                'resumed.'.format(filename))
+        return hdf5_file, False
+    hdf5_file = h5py.File(filename, 'w')
+    hdf5_file.attrs[INPUT_HASH_KEY] = input_hash
+    return hdf5_file, True
@@ -1,9 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 import h5py
 import numpy as np
 from upho.analysis.smearing import Smearing, create_points
+from upho.phonon.eigenstates import read_weights
+from upho.phonon.hdf5_layout import open_band_data
+from upho.phonon.parallel import create_chunksize
+from upho.log import log_point
+
+logger = logging.getLogger(__name__)
 
 
 __author__ = "Yuji Ikeda"
@@ -14,6 +24,28 @@ def square_frequencies(frequencies):
     return frequencies_2
 
 
+def encode_cutoff(cutoff):
+    """Convert "cutoff" to a float written to HDF5, NaN for None"""
+    return np.nan if cutoff is None else float(cutoff)
+
+
+def is_completed(file_output, group):
+    return group in file_output and file_output[group].attrs.get('completed', False)
+
+
+# Object to calculate spectral functions in each worker process.
+_density_calculator = None
+
+
+def _initialize_worker(filename, smearing_kwargs):
+    global _density_calculator
+    _density_calculator = DensityCalculator(filename, smearing_kwargs)
+
+
+def _calculate_point(group):
+    return _density_calculator._calculate_point(group)
+
+
 class DensityExtractor(object):
     def __init__(self,
                  filename=None,
@@ -23,14 +55,50 @@ class DensityExtractor(object):
                  fpitch=0.05,
                  sigma=1.0,
                  is_squared=True,
-                 group=None):
+                 group=None,
+                 cutoff=None,
+                 n_workers=1,
+                 is_resumed=False):
+        """
 
-        self._is_squared = is_squared
+        Parameters
+        ----------
+        n_workers : Integer
+            The number of worker processes sharing q-points.
+            Each worker opens "filename" read-only, and the results are
+            written by the present process.
+        is_resumed : Bool
+            If True, q-points already completed in the existing output
+            file are skipped. Only for "DensityExtractorHDF5".
+        """
         self._group = group
+        self._n_workers = n_workers
+        self._is_resumed = is_resumed
+
+        self._smearing_kwargs = {
+            'function': function,
+            'fmin': fmin,
+            'fmax': fmax,
+            'fpitch': fpitch,
+            'sigma': sigma,
+            'is_squared': is_squared,
+            'cutoff': cutoff,
+        }
+        self._set_smearing(**self._smearing_kwargs)
+
+        self._filename = filename
+        with h5py.File(filename, 'r') as f:
+            self._band_data = open_band_data(f)
+            self._run()
+
+    def _set_smearing(self, function, fmin, fmax, fpitch, sigma, is_squared,
+                      cutoff):
+        self._is_squared = is_squared
 
         self._smearing = Smearing(
             function_name=function,
             sigma=sigma,
+            cutoff=cutoff,
         )
 
         frequencies = create_points(fmin, fmax, fpitch)
@@ -42,10 +110,6 @@ class DensityExtractor(object):
             energies = frequencies
         self._smearing.set_xs(energies)
 
-        with h5py.File(filename, 'r') as f:
-            self._band_data = f
-            self._run()
-
     def set_evaluated_energies(self, evaluated_energies):
         self._evaluated_energies = evaluated_energies
 
@@ -55,13 +119,64 @@ class DensityExtractor(object):
     def _run(self):
         raise NotImplementedError
 
+    def _calculate_point(self, group):
+        frequencies = self._load_frequencies(group)
+        frequencies = np.array(frequencies)
+        if self._is_squared:
+            energies = square_frequencies(frequencies)
+        else:
+            energies = frequencies
+
+        weights = self._load_weights(group)
+
+        return self.calculate_spectral_functions(energies, weights)
+
+    def _calculate_points(self, groups):
+        """Calculate spectral functions for the groups
+
+        Yields
+        ------
+        group : String
+        spectral_functions : Dictionary
+            In the order of "groups".
+        """
+        if self._n_workers == 1:
+            for group in groups:
+                log_point(logger, group, self._get_npoints())
+                yield group, self._calculate_point(group)
+            return
+
+        chunksize = create_chunksize(len(groups), self._n_workers)
+        # Workers are spawned not to inherit the HDF5 file opened here.
+        with ProcessPoolExecutor(
+                max_workers=self._n_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_worker,
+                initargs=(self._filename, self._smearing_kwargs)) as executor:
+            results = executor.map(
+                _calculate_point, groups, chunksize=chunksize)
+            for group, spectral_functions in zip(groups, results):
+                log_point(logger, group, self._get_npoints())
+                yield group, spectral_functions
+
+    def _get_npoints(self):
+        return self._band_data['paths'].shape[1]
+
+    def _create_groups(self):
+        npaths, npoints = self._band_data['paths'].shape[:2]
+        groups = []
+        for ipath in range(npaths):
+            for ip in range(npoints):
+                groups.append('{}/{}/'.format(ipath, ip))
+        return groups
+
     def _load_weights(self, group):
         band_data = self._band_data
         weights = {}
         weights['total'] = band_data[group + 'weights_t'  ]
-        weights['E1'   ] = band_data[group + 'weights_e'  ]
+        weights['E1'   ] = read_weights(band_data[group + 'weights_e'  ])
         weights['SR'   ] = band_data[group + 'weights_s'  ]
-        weights['SR_E1'] = band_data[group + 'weights_s_e']
+        weights['SR_E1'] = read_weights(band_data[group + 'weights_s_e'])
         if group + 'weights_e2' in band_data:
             weights['E2'   ] = band_data[group + 'weights_e2' ]
         return weights
@@ -76,24 +191,35 @@ class DensityExtractor(object):
         return frequencies
 
     def calculate_spectral_functions(self, frequencies, weights, is_SR_E1=True):
+        # The kernels for the arms are shared among the kinds of weights.
+        kernels = self.create_kernels(frequencies)
         spectral_functions = {}
         for k, v in weights.items():
             if k == 'SR_E1' and not is_SR_E1:
                 continue
-            spectral_functions[k] = self.calculate_density(frequencies, v)
+            spectral_functions[k] = self.calculate_density(
+                frequencies, v, kernels=kernels)
         return spectral_functions
 
-    def calculate_density(self, frequencies, weights):
+    def create_kernels(self, frequencies):
+        return [self._smearing.create_kernel(f) for f in frequencies]
+
+    def calculate_density(self, frequencies, weights, kernels=None):
         """
 
         Parameters
         ----------
         frequencies : (num_arms, nbands) array
         weights : (num_arms, ... , nbands) array
+        kernels : List of kernels
+            Made by "create_kernels" for "frequencies". If None, they are
+            created here.
         """
+        if kernels is None:
+            kernels = self.create_kernels(frequencies)
         density_data = []
-        for f, w in zip(frequencies, weights):
-            density_data.append(self._smearing.run(f, w))
+        for kernel, w in zip(kernels, weights):
+            density_data.append(self._smearing.run_kernel(kernel, w))
         density_data = np.sum(density_data, axis=0)  # Sum over arms
         return density_data
 
@@ -132,29 +258,27 @@ class DensityExtractor(object):
 
 class DensityExtractorHDF5(DensityExtractor):
     def _run(self):
-        band_data = self._band_data
-
-        npaths, npoints = band_data['paths'].shape[:2]
         filename_sf = 'sf.hdf5'
-        with h5py.File(filename_sf, 'w') as f:
-            self._print_header(f)
-            for ipath in range(npaths):
-                for ip in range(npoints):
-                    print(ipath, ip)
-                    group = '{}/{}/'.format(ipath, ip)
-
-                    frequencies = self._load_frequencies(group)
-                    frequencies = np.array(frequencies)
-                    if self._is_squared:
-                        energies = square_frequencies(frequencies)
-                    else:
-                        energies = frequencies
+        groups = self._create_groups()
 
-                    weights = self._load_weights(group)
+        if self._is_resumed and os.path.isfile(filename_sf):
+            mode = 'a'
+        else:
+            mode = 'w'
 
-                    spectral_functions = self.calculate_spectral_functions(energies, weights)
+        with h5py.File(filename_sf, mode) as f:
+            if mode == 'a':
+                self._check_header(f)
+                groups = [g for g in groups if not is_completed(f, g)]
+            else:
+                self._print_header(f)
 
-                    self._write(f, group, spectral_functions)
+            for group, spectral_functions in self._calculate_points(groups):
+                if group in f:  # Incomplete data written before
+                    del f[group]
+                self._write(f, group, spectral_functions)
+                f[group].attrs['completed'] = True
+                f.flush()
 
     def _write(self, file_out, group, spectral_functions):
 
@@ -190,15 +314,37 @@ class DensityExtractorHDF5(DensityExtractor):
 
         file_output.create_dataset('function', data=function_name)
         file_output.create_dataset('sigma', data=sigma)  # For THz^2 or THz
+        file_output.create_dataset(
+            'cutoff', data=encode_cutoff(self._smearing.get_cutoff()))
         file_output.create_dataset('is_squared', data=is_squared)
         file_output.create_dataset('frequencies', data=frequencies)
         file_output.create_dataset('paths', data=self._band_data['paths'])
 
+    def _check_header(self, file_output):
+        """Check if the existing output is made with the same parameters"""
+        # Files without "cutoff" were made before it was introduced.
+        cutoff = (np.array(file_output['cutoff'])
+                  if 'cutoff' in file_output else np.nan)
+        is_same = (
+            np.array(file_output['function']).astype(str) ==
+            self._smearing.get_function_name() and
+            np.array(file_output['sigma']) == self._smearing.get_sigma() and
+            np.array_equal(cutoff, encode_cutoff(self._smearing.get_cutoff()),
+                           equal_nan=True) and
+            bool(np.array(file_output['is_squared'])) == self._is_squared and
+            np.array_equal(np.array(file_output['frequencies']),
+                           self._evaluated_energies) and
+            np.array_equal(np.array(file_output['paths']),
+                           np.array(self._band_data['paths']))
+        )
+        if not is_same:
+            raise ValueError(
+                'sf.hdf5 was made with different parameters and cannot be '
+                'resumed.')
+
 
 class DensityExtractorText(DensityExtractor):
     def _run(self):
-        band_data = self._band_data
-        npaths, npoints = band_data['paths'].shape[:2]
         fn_irreps = 'sf_SR.dat'
         fn_e1     = 'sf_E1.dat'
         fn_e2     = 'sf_E2.dat'
@@ -207,27 +353,15 @@ class DensityExtractorText(DensityExtractor):
             self._print_header(fe)
             self._print_header(fe2)
             if self._group is None:
-                for ipath in range(npaths):
-                    for ip in range(npoints):
-                        print(ipath, ip)
-                        group = '{}/{}/'.format(ipath, ip)
-                        self._run_point(group, fi, fe, fe2)
+                groups = self._create_groups()
             else:
-                self._run_point(self._group, fi, fe, fe2)
+                groups = [self._group]
+            for group, spectral_functions in self._calculate_points(groups):
+                self._write_point(
+                    group, spectral_functions, fi, fe, fe2)
 
-    def _run_point(self, group, fi, fe, fe2):
-        distance    = self._load_distance   (group)
-        frequencies = self._load_frequencies(group)
-        weights     = self._load_weights    (group)
-
-        frequencies = np.array(frequencies)
-        if self._is_squared:
-            energies = square_frequencies(frequencies)
-        else:
-            energies = frequencies
-
-        spectral_functions = self.calculate_spectral_functions(
-            energies, weights)
+    def _write_point(self, group, spectral_functions, fi, fe, fe2):
+        distance = self._load_distance(group)
 
         self._write_irreps(fi , group, distance, spectral_functions)
         self._write_e1    (fe , group, distance, spectral_functions)
@@ -328,3 +462,14 @@ class DensityExtractorText(DensityExtractor):
 
     def _get_elements(self, group):
         return [x.decode('ascii') for x in self._band_data[group + 'elements']]
+
+
+class DensityCalculator(DensityExtractor):
+    """Calculate spectral functions without writing them
+
+    This is used in worker processes of "DensityExtractor".
+    """
+    def __init__(self, filename, smearing_kwargs):
+        self._set_smearing(**smearing_kwargs)
+        # Kept open read-only during the lifetime of the worker.
+        self._band_data = open_band_data(h5py.File(filename, 'r'))
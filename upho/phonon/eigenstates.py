@@ -1,13 +1,17 @@
+import logging
 import numpy as np
 from phonopy.structure.cells import get_primitive
 from phonopy.units import VaspToTHz
+from upho.harmonic.dynamical_matrix import UnfolderDynamicalMatrix
 from upho.phonon.star_creator import StarCreator
 from upho.phonon.translational_projector import TranslationalProjector
 from upho.phonon.rotational_projector import RotationalProjector
 from upho.phonon.vectors_adjuster import VectorsAdjuster
 from upho.phonon.element_weights_calculator import (
     ElementWeightsCalculator)
-from upho.analysis.time_measurer import TimeMeasurer
+from upho.analysis.time_measurer import get_profiler
+
+logger = logging.getLogger(__name__)
 
 
 class Eigenstates(object):
@@ -18,8 +22,15 @@ class Eigenstates(object):
                  star="none",
                  mode="eigenvector",
                  factor=VaspToTHz,
+                 cache_dir=None,
                  verbose=False):
+        """
+
+        cache_dir : Directory to cache the arrays for the setup.
+            Not cached if None.  See "upho.structure.setup_cache".
+        """
         self._verbose = verbose
+        self._cache_dir = cache_dir
         self._mode = mode
 
         self._factor = factor
@@ -33,11 +44,12 @@ class Eigenstates(object):
         self._primitive = get_primitive(
             self._unitcell_ideal, primitive_matrix_ideal)
 
-        self._build_star_creator()
-        self._generate_translational_projector()
-        self._generate_vectors_adjuster()
-        self._create_rotational_projector()
-        self._build_element_weights_calculator()
+        with get_profiler().measure('setup'):
+            self._build_star_creator()
+            self._generate_translational_projector()
+            self._generate_vectors_adjuster()
+            self._create_rotational_projector()
+            self._build_element_weights_calculator()
 
     def _build_element_weights_calculator(self):
         unitcell_orig   = self._cell
@@ -55,18 +67,19 @@ class Eigenstates(object):
 
         self._star_creator = StarCreator(
             is_overlapping=is_overlapping,
-            atoms=primitive_ideal_wrt_unitcell)
+            atoms=primitive_ideal_wrt_unitcell,
+            cache_dir=self._cache_dir)
 
         if self._star == "none":
             self._nopr = 1
         else:  # "sym" or "all"
             self._nopr = len(self._star_creator.get_rotations())
 
-        print("nopr:", self._nopr)
+        logger.debug("nopr: %d", self._nopr)
 
     def _generate_translational_projector(self):
         self._translational_projector = TranslationalProjector(
-            self._primitive, self._unitcell_ideal)
+            self._primitive, self._unitcell_ideal, cache_dir=self._cache_dir)
 
     def _create_rotational_projector(self):
         self._rotational_projector = RotationalProjector(self._primitive)
@@ -93,13 +106,20 @@ class Eigenstates(object):
             q_star, transformation_matrices = (
                 self._star_creator.create_star(q))
 
-        print("len(q_star):", len(q_star))
-        print("q_star:")
-        print(q_star)
+        logger.debug("len(q_star): %d", len(q_star))
+        logger.debug("q_star:\n%s", q_star)
 
         return q_star, transformation_matrices
 
     def extract_eigenstates(self, q):
+        profiler = get_profiler()
+        with profiler.measure('qpoint'):
+            self._extract_eigenstates(q)
+        logger.info("q: %s  arms: %d", q, self.get_narms())
+        profiler.count('qpoints')
+        profiler.count('arms', self.get_narms())
+
+    def _extract_eigenstates(self, q):
         """
 
         Parameters
@@ -114,17 +134,20 @@ class Eigenstates(object):
             'E1'    : (num_arms, natoms_p, nelements, nbands)
             'SR_E1' : (num_arms, num_irreps, natoms_p, nelements, natoms_p, nelements, nbands)
         """
-        print("=" * 40)
-        print("q:", q)
-        print("=" * 40)
+        logger.debug("=" * 40)
+        logger.debug("q: %s", q)
+        logger.debug("=" * 40)
 
         rotational_projector = self._rotational_projector
         rotational_projector.create_standard_rotations(q)
-        print("pointgroup_symbol:", self.get_pointgroup_symbol())
+        logger.debug("pointgroup_symbol: %s", self.get_pointgroup_symbol())
 
         q_star, transformation_matrices = self.create_q_star(q)
 
-        eigvals_arms = []  # (num_arms, nbands)
+        primitive_matrix = self._primitive.get_primitive_matrix()
+        q_sc_star = get_q_sc_from_q_pc(q_star, primitive_matrix)
+
+        eigvals_arms, eigvecs_arms = self.solve_eigenproblems(q_sc_star)
 
         weights_arms = {}
         weights_keys = ['total', 'SR', 'E1', 'SR_E1', 'E2']
@@ -132,26 +155,29 @@ class Eigenstates(object):
             weights_arms[k] = []
 
         for i_star, (q, transformation_matrix) in enumerate(zip(q_star, transformation_matrices)):
-            print("i_star:", i_star)
-            print("q_pc:", q)
-            eigvals, eigvecs, weights = self._extract_eigenstates_for_q(
-                q, transformation_matrix)
+            logger.debug("i_star: %d", i_star)
+            logger.debug("q_pc: %s", q)
+            weights = self._extract_eigenstates_for_q(
+                q, transformation_matrix, eigvecs_arms[i_star])
 
-            eigvals_arms.append(eigvals)
             for k in weights_keys:
                 weights_arms[k].append(weights[k])
 
-        frequencies_arms = calculate_frequencies(np.array(eigvals_arms), self._factor)
+        frequencies_arms = calculate_frequencies(eigvals_arms, self._factor)
 
         for k in weights_keys:
             weights_arms[k] = np.array(weights_arms[k]) / len(q_star)
 
-        for k in weights_keys:
-            print("Sum of weights_arms {:5s} :".format(k), np.nansum(weights_arms[k]))
+        if logger.isEnabledFor(logging.DEBUG):
+            for k in weights_keys:
+                logger.debug("Sum of weights_arms {:5s} : {}".format(
+                    k, np.nansum(weights_arms[k])))
 
         self._q_star = q_star
         self._point = q
 
+        self._eigenvalues_arms = eigvals_arms
+        self._eigenvectors_arms = eigvecs_arms
         self._frequencies_arms     = frequencies_arms
         self._weights_arms = weights_arms
 
@@ -184,57 +210,101 @@ class Eigenstates(object):
     def get_num_irreps(self):
         return self._rotational_projector.get_num_irs()
 
-    def _extract_eigenstates_for_q(self, q_pc, transformation_matrix):
-        """Extract eigenstates with their weights.
+    def solve_eigenproblems(self, qpoints_sc):
+        """Solve eigenproblems of dynamical matrices at once.
+
+        The dynamical matrices are stacked and diagonalized by one call of
+        "np.linalg.eigh". This can be used both for the arms of the star and
+        for a chunk of q-points along a path.
+
+        Parameters
+        ----------
+        qpoints_sc : (nqpoints, 3) array
+            Reciprocal space points in fractional coordinates for "SC".
+
+        Returns
+        -------
+        eigvals : (nqpoints, nbands) array
+            Eigenvalues of "SC".
+        eigvecs : (nqpoints, nbands, nbands) array
+            Eigenvectors of "SC".
+        """
+        profiler = get_profiler()
+        with profiler.measure('dynamical_matrix'):
+            dms = self._create_dynamical_matrices(qpoints_sc)
+        with profiler.measure('eigh'):
+            return np.linalg.eigh(dms)
+
+    def _create_dynamical_matrices(self, qpoints_sc):
+        """
+
+        Parameters
+        ----------
+        qpoints_sc : (nqpoints, 3) array
+            Reciprocal space points in fractional coordinates for "SC".
+
+        Returns
+        -------
+        dms : (nqpoints, nbands, nbands) array
+        """
+        dynamical_matrix = self._dynamical_matrix
+        logger.debug("qpoints_sc:\n%s", qpoints_sc)
+
+        if isinstance(dynamical_matrix, UnfolderDynamicalMatrix):
+            return dynamical_matrix.get_dynamical_matrices(qpoints_sc)
+
+        dms = []
+        for q_sc in qpoints_sc:
+            dynamical_matrix.set_dynamical_matrix(q_sc)
+            dms.append(dynamical_matrix.get_dynamical_matrix())
+        return np.array(dms)
+
+    def _extract_eigenstates_for_q(self, q_pc, transformation_matrix, eigvecs):
+        """Extract weights of eigenstates.
 
         Parameters
         ----------
         q_pc : Reciprocal space point in fractional coordinatees for PC.
         transformation_matrix
+        eigvecs : Eigenvectors of "SC" at q_pc.
 
         Returns
         -------
-        eigvals : Eigenvalues of "SC".
-        eigvecs : Eigenvectors of "SC".
         weights : Weights for the phonon modes of SC on PC.
             'E1' : (natoms_p, nelms, natoms_p, nelms, nbands) complex array
         """
         primitive_matrix = self._primitive.get_primitive_matrix()
         q_sc = get_q_sc_from_q_pc(q_pc, primitive_matrix)
 
-        print("q_sc:", q_sc)
-
-        self._dynamical_matrix.set_dynamical_matrix(q_sc)
-        dm = self._dynamical_matrix.get_dynamical_matrix()
-        with TimeMeasurer('Solve eigenproblem'):
-            eigvals, eigvecs = np.linalg.eigh(dm)
-
         weights = {}
+        profiler = get_profiler()
 
-        with TimeMeasurer('Calculate weights for wavevectors'):
+        with profiler.measure('translational_projection'):
             weights['total'], t_proj_eigvecs = self._extract_weights(q_sc, eigvecs)
 
-        try:
-            weights['SR'], rot_proj_vectors = self._create_rot_projection_weights(
-                q_pc, transformation_matrix, t_proj_eigvecs)
-        except ValueError:
-            weights['SR'] = np.nan
+        with profiler.measure('rotational_projection'):
+            try:
+                weights['SR'], rot_proj_vectors = self._create_rot_projection_weights(
+                    q_pc, transformation_matrix, t_proj_eigvecs)
+            except ValueError:
+                weights['SR'] = np.nan
 
         # if __debug__:
         #     self._print_debug(eigvals, rot_weights)
 
-        vectors_elements = self._create_vectors_elements(eigvecs)
-        weights['E1'], t_proj_elm_vecs = self._create_weights_e1(vectors_elements, q_sc            )
-        weights['E2']                  = self._create_weights_e2(vectors_elements, weights['total'])
+        with profiler.measure('element_weights'):
+            weights['E1'], t_proj_elm_vecs = self._create_weights_e1(eigvecs, q_sc            )
+            weights['E2']                  = self._create_weights_e2(eigvecs, weights['total'])
 
-        try:
-            weights['SR_E1'], rot_proj_elm_vecs = self._create_rotational_weights_for_elements(
-                q_pc, transformation_matrix, t_proj_elm_vecs
-            )
-        except ValueError:
-            weights['SR_E1'] = np.nan
+        with profiler.measure('rotational_projection_elements'):
+            try:
+                weights['SR_E1'], rot_proj_elm_vecs = self._create_rotational_weights_for_elements(
+                    q_pc, transformation_matrix, t_proj_elm_vecs
+                )
+            except ValueError:
+                weights['SR_E1'] = np.nan
 
-        return eigvals, eigvecs, weights
+        return weights
 
     def _extract_weights(self, q, eigvecs):
         """Extract weights.
@@ -288,14 +358,7 @@ class Eigenstates(object):
         projected_vectors = self._rotational_projector.project_vectors(
             vectors, kpoint, transformation_matrix)
 
-        nirreps, natoms_p, nelms, tmp, nbands = projected_vectors.shape
-
-        shape = (nirreps, natoms_p, nelms, natoms_p, nelms, nbands)
-        weights = np.zeros(shape, dtype=complex)
-        for i in range(nirreps):
-            for j in range(nbands):
-                weights[i, ..., j] = np.inner(
-                    np.conj(projected_vectors[i, ..., j]), projected_vectors[i, ..., j])
+        weights = calculate_element_pair_weights(projected_vectors)
 
         return weights, projected_vectors
 
@@ -318,53 +381,61 @@ class Eigenstates(object):
             print("".join("{:12.6f}".format(v) for v in values[:num_irs]), end="")
             print()
 
-    def _create_vectors_elements(self, vectors):
-        elemental_projector = self._element_weights_calculator
-        vectors_elements = elemental_projector.project_vectors(vectors)
-        return vectors_elements
-
-    def _create_weights_e1(self, vectors_elements, kpoint):
+    def _create_weights_e1(self, vectors, kpoint):
         """
 
         Parameters
         ----------
-        vectors_elements : (natoms_p, nelms, natoms_u * ndims, nbands) array
+        vectors : (natoms_u * ndims, nbands) array
         kpoint : Reciprocal space point in fractional coordinates for SC.
 
         Returns
         -------
         weights_e1 : (natoms_p, nelms, natoms_p, nelms, nbands) array
             Elemental weights.
-        projected_vectors : (natoms_p, nelms, natoms_u * ndims, nbands) array
+        projected_vectors : (natoms_p, nelms, natoms_p * ndims, nbands) array
             Elemental projected vectors.
+
+        Note
+        ----
+        Only the non-empty (sublattice, element) blocks of the vectors are
+        projected to avoid the dense (natoms_p, nelms, natoms_u * ndims,
+        nbands) array.
         """
         translational_projector = self._translational_projector
+        elemental_projector = self._element_weights_calculator
 
-        projected_vectors = translational_projector.project_vectors(
-            vectors=vectors_elements, kpoint=kpoint)
+        natoms_p = self._primitive.get_number_of_atoms()
+        nelms = elemental_projector.get_number_of_elements()
+        ndims = 3
+        nbands = vectors.shape[-1]
 
-        natoms_p, nelms, tmp, nbands = projected_vectors.shape
+        projected_vectors = np.zeros(
+            (natoms_p, nelms, natoms_p * ndims, nbands), dtype=vectors.dtype)
+        blocks = elemental_projector.project_vectors_segmented(vectors)
+        for ip, ie, indices, vectors_block in blocks:
+            projected_vectors[ip, ie] = (
+                translational_projector.project_vectors_partial(
+                    vectors_block, indices, kpoint))
 
-        weights_e1 = np.zeros((natoms_p, nelms, natoms_p, nelms, nbands), dtype=complex)
-        for i in range(nbands):
-            weights_e1[..., i] = np.inner(
-                np.conj(projected_vectors[..., i]), projected_vectors[..., i])
+        weights_e1 = calculate_element_pair_weights(projected_vectors)
 
         return weights_e1, projected_vectors
 
-    def _create_weights_e2(self, vectors_elements, weights_total):
+    def _create_weights_e2(self, vectors, weights_total):
         """
         
         Parameters
         ----------
-        vectors_elements : (natoms_p, nelms, natoms_u * ndims, nbands) array
+        vectors : (natoms_u * ndims, nbands) array
         weights_total : (nbands) array
 
         Returns
         -------
         weights_e2 : (natoms_p, nelms, nbands) array
         """
-        weights_tmp = np.linalg.norm(vectors_elements, axis=2) ** 2  # (natoms_p, nelms, nbands)
+        elemental_projector = self._element_weights_calculator
+        weights_tmp = elemental_projector.run(vectors)  # (natoms_p, nelms, nbands)
         weights_e2 = weights_total * weights_tmp
         return weights_e2
 
@@ -378,14 +449,16 @@ class Eigenstates(object):
         return np.array(
             self._element_weights_calculator.get_reduced_elements(), dtype='S')
 
-    def write_hdf5(self, hdf5_file, group=''):
-        """
+    def get_data_dict(self, is_eigenvalues=False, is_eigenvectors=False):
+        """Return the data at the present q-point to be written to HDF5
 
         Parameters
         ----------
-        hdf5_file : HDF5 file object
-        group : String
-            Indices for the present q-point.
+        is_eigenvalues : Bool
+            If True, "eigenvalues" (num_arms, nbands) are also included.
+        is_eigenvectors : Bool
+            If True, "eigenvectors" (num_arms, nbands, nbands) are also
+            included.
         """
         natoms_primitive = self._cell.get_number_of_atoms()
 
@@ -406,10 +479,161 @@ class Eigenstates(object):
             'weights_s_e'      : self._weights_arms['SR_E1'],
             'weights_e2'       : self._weights_arms['E2'   ],
         }
+        if is_eigenvalues:
+            data_dict['eigenvalues'] = self._eigenvalues_arms
+        if is_eigenvectors:
+            data_dict['eigenvectors'] = self._eigenvectors_arms
+        return data_dict
 
-        for k, v in data_dict.items():
+    def write_hdf5(self, hdf5_file, group='', weights_storage='full'):
+        """
+
+        Parameters
+        ----------
+        hdf5_file : HDF5 file object
+        group : String
+            Indices for the present q-point.
+        weights_storage : String
+            "full" or "packed". See "write_data_dict".
+        """
+        write_data_dict(hdf5_file, self.get_data_dict(), group=group,
+                        weights_storage=weights_storage)
+
+
+# Weights Hermitian w.r.t. the pairs of (atom, element).
+ELEMENT_PAIR_WEIGHTS_KEYS = ('weights_e', 'weights_s_e')
+
+
+def write_data_dict(hdf5_file, data_dict, group='', weights_storage='full'):
+    """Write the data obtained by "Eigenstates.get_data_dict"
+
+    Parameters
+    ----------
+    hdf5_file : HDF5 file object
+    data_dict : dictionary
+    group : String
+        Indices for the present q-point.
+    weights_storage : String
+        "full" writes the weights for pairs of (atom, element) as they are.
+        "packed" writes only their upper triangles in complex64 with
+        chunking and compression. Such datasets have the attribute
+        "storage" = "packed" and the original shape in "shape", and are
+        expanded by "read_weights".
+    """
+    if weights_storage not in ('full', 'packed'):
+        raise ValueError(
+            'Unknown weights_storage: {}'.format(weights_storage))
+    for k, v in data_dict.items():
+        if (weights_storage == 'packed' and
+                k in ELEMENT_PAIR_WEIGHTS_KEYS and np.ndim(v) >= 5):
+            dataset = hdf5_file.create_dataset(
+                group + k,
+                data=pack_element_pair_weights(v).astype(np.complex64),
+                chunks=True,
+                compression='gzip')
+            dataset.attrs['storage'] = 'packed'
+            dataset.attrs['shape'] = np.shape(v)
+        else:
             hdf5_file.create_dataset(group + k, data=v)
 
+
+def read_weights(dataset):
+    """Read weights written by "write_data_dict"
+
+    Parameters
+    ----------
+    dataset : HDF5 dataset object or array
+
+    Returns
+    -------
+    weights : array
+        Weights with the original shape also for "packed" storage.
+    """
+    attrs = getattr(dataset, 'attrs', {})
+    if attrs.get('storage', 'full') == 'packed':
+        return unpack_element_pair_weights(
+            np.array(dataset), tuple(dataset.attrs['shape']))
+    return dataset
+
+
+def pack_element_pair_weights(weights):
+    """Pack the upper triangle of weights for pairs of (atom, element).
+
+    Parameters
+    ----------
+    weights : (..., natoms_p, nelms, natoms_p, nelms, nbands) array
+
+    Returns
+    -------
+    weights_packed : (..., npairs, nbands) array
+        npairs = n * (n + 1) / 2 with n = natoms_p * nelms.
+    """
+    shape = np.shape(weights)
+    n = shape[-5] * shape[-4]
+    iu, ju = np.triu_indices(n)
+    tmp = np.reshape(weights, shape[:-5] + (n, n, shape[-1]))
+    return tmp[..., iu, ju, :]
+
+
+def unpack_element_pair_weights(weights, shape):
+    """Inverse of "pack_element_pair_weights"
+
+    Parameters
+    ----------
+    weights : (..., npairs, nbands) array
+    shape : Tuple
+        (..., natoms_p, nelms, natoms_p, nelms, nbands)
+    """
+    n = shape[-5] * shape[-4]
+    return expand_upper_triangle(weights, n).reshape(shape)
+
+
+def calculate_element_pair_weights(vectors):
+    """Calculate weights for pairs of (atom, element) projected vectors.
+
+    The weights for all the bands are calculated by one batched matmul.
+
+    Parameters
+    ----------
+    vectors : (..., natoms_p, nelms, natoms_p * ndims, nbands) array
+
+    Returns
+    -------
+    weights : (..., natoms_p, nelms, natoms_p, nelms, nbands) array
+        Hermitian w.r.t. the pairs of (atom, element).
+        See "pack_element_pair_weights" to store only the upper triangle.
+    """
+    shape = vectors.shape
+    n = shape[-4] * shape[-3]
+    tmp = vectors.reshape(shape[:-4] + (n, ) + shape[-2:])
+    tmp = np.moveaxis(tmp, -1, -3)  # (..., nbands, n, natoms_p * ndims)
+    weights = np.matmul(np.conj(tmp), np.swapaxes(tmp, -2, -1))
+    weights = np.moveaxis(weights, -3, -1).reshape(
+        shape[:-4] + shape[-4:-2] * 2 + shape[-1:])
+    return weights
+
+
+def expand_upper_triangle(weights, n):
+    """Expand the upper triangle of Hermitian weights.
+
+    Parameters
+    ----------
+    weights : (..., n * (n + 1) / 2, nbands) array
+        Upper triangle in the order of "np.triu_indices(n)".
+    n : Integer
+
+    Returns
+    -------
+    weights_expanded : (..., n, n, nbands) array
+    """
+    iu, ju = np.triu_indices(n)
+    shape = weights.shape[:-2] + (n, n, weights.shape[-1])
+    weights_expanded = np.zeros(shape, dtype=complex)
+    weights_expanded[..., ju, iu, :] = np.conj(weights)
+    weights_expanded[..., iu, ju, :] = weights
+    return weights_expanded
+
+
 def calculate_frequencies(eigenvalues, factor):
     frequencies = np.sqrt(np.abs(eigenvalues)) * np.sign(eigenvalues)
     frequencies *= factor
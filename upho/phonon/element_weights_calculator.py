@@ -22,6 +22,7 @@ class ElementWeightsCalculator(object):
         """
         self._extract_map_elements(unitcell)
         self._extract_map_atoms_u2p(primitive)
+        self._create_index_tables()
 
     def _extract_map_elements(self, unitcell):
         natoms_u = unitcell.get_number_of_atoms()
@@ -54,6 +55,34 @@ class ElementWeightsCalculator(object):
 
         self._map_atoms_u2p = map_atoms_u2p
 
+    def _create_index_tables(self):
+        """Create the atom indices for the (sublattice, element) blocks.
+
+        block_indices : List of (ip, ie, indices)
+            Only non-empty blocks are stored.
+        map_atoms_to_blocks : (natoms_u) array
+            Index of the block "ip * nelms + ie" for each atom.
+        """
+        map_atoms_u2p = self._map_atoms_u2p
+        map_elements = self._map_elements
+        natoms_u = sum(len(v) for v in map_elements)
+        nelms = len(map_elements)
+
+        block_indices = []
+        map_atoms_to_blocks = np.full(natoms_u, -1, dtype=int)
+        for ip, lp in enumerate(map_atoms_u2p):
+            for ie, le in enumerate(map_elements):
+                indices = np.array(sorted(set(lp) & set(le)), dtype=int)
+                if len(indices) > 0:  # The element "le" exists on the sublattice.
+                    block_indices.append((ip, ie, indices))
+                    map_atoms_to_blocks[indices] = ip * nelms + ie
+
+        if np.any(map_atoms_to_blocks == -1):
+            raise ValueError("Mapping of blocks is failed.")
+
+        self._block_indices = block_indices
+        self._map_atoms_to_blocks = map_atoms_to_blocks
+
     def get_map_elements(self):
         return self._map_elements
 
@@ -98,40 +127,64 @@ class ElementWeightsCalculator(object):
         -------
         weights : (natoms_p, nelements, nbands) array
         """
-        map_atoms_u2p = self._map_atoms_u2p
-        map_elements = self._map_elements
+        natoms_p = len(self._map_atoms_u2p)
+        num_elements = len(self._map_elements)
 
         shape = vectors.shape
         nbands = shape[1]
         tmp = vectors.reshape(shape[0] // ndims, ndims, nbands)
         weights_atoms = np.linalg.norm(tmp, axis=1) ** 2
 
-        shape_weights = (len(map_atoms_u2p), len(map_elements), nbands)
-        weights = np.full(shape_weights, np.nan)  # Initialization
-
-        for ip, lp in enumerate(map_atoms_u2p):
-            for ie, le in enumerate(map_elements):
-                indices = sorted(set(lp) & set(le))
-                weights[ip, ie] = np.sum(weights_atoms[indices], axis=0)
+        weights = np.zeros((natoms_p * num_elements, nbands))
+        np.add.at(weights, self._map_atoms_to_blocks, weights_atoms)
 
-        return weights
+        return weights.reshape(natoms_p, num_elements, nbands)
 
     def project_vectors(self, vectors, ndims=3):
-        map_atoms_u2p = self._map_atoms_u2p
-        map_elements = self._map_elements
+        """
+
+        Parameters
+        ----------
+        vectors : (natoms_u * ndims, nbands) array
+        ndims : Integer
+            number of dimensions of the space.
 
-        natoms_p = len(map_atoms_u2p)
-        num_elements = len(map_elements)
+        Returns
+        -------
+        projected_vectors : (natoms_p, nelements, natoms_u * ndims, nbands) array
+            Mostly zeros. "project_vectors_segmented" gives only the
+            non-empty blocks.
+        """
+        natoms_p = len(self._map_atoms_u2p)
+        num_elements = len(self._map_elements)
 
-        tmp = np.zeros_like(vectors[None, None])  # Add two dimensions
-        projected_vectors = (
-            np.repeat(np.repeat(tmp, natoms_p, axis=0), num_elements, axis=1))
+        nrows = vectors.shape[0]
+        projected_vectors = np.zeros(
+            (natoms_p * num_elements, ) + vectors.shape, dtype=vectors.dtype)
+        map_rows_to_blocks = np.repeat(self._map_atoms_to_blocks, ndims)
+        projected_vectors[map_rows_to_blocks, np.arange(nrows)] = vectors
 
-        for ip, lp in enumerate(map_atoms_u2p):
-            for ie, le in enumerate(map_elements):
-                indices_tmp = sorted(set(lp) & set(le))
-                indices = MappingsModifier(indices_tmp).expand_mappings(ndims)
-                if len(indices) > 0:  # The element "le" exists on the sublattice.
-                    projected_vectors[ip, ie, indices] = vectors[indices]
+        return projected_vectors.reshape(
+            (natoms_p, num_elements) + vectors.shape)
 
-        return projected_vectors
+    def project_vectors_segmented(self, vectors, ndims=3):
+        """
+
+        Parameters
+        ----------
+        vectors : (natoms_u * ndims, nbands) array
+        ndims : Integer
+            number of dimensions of the space.
+
+        Returns
+        -------
+        blocks : List of (ip, ie, indices, vectors_block)
+            Only the non-empty (sublattice, element) blocks.
+            "indices" are the rows of "vectors" on the block, and
+            "vectors_block" = vectors[indices].
+        """
+        blocks = []
+        for ip, ie, indices_atoms in self._block_indices:
+            indices = MappingsModifier(indices_atoms).expand_mappings(ndims)
+            blocks.append((ip, ie, indices, vectors[indices]))
+        return blocks
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import h5py
+import numpy as np
+from upho.phonon.eigenstates import (
+    ELEMENT_PAIR_WEIGHTS_KEYS,
+    pack_element_pair_weights,
+    unpack_element_pair_weights)
+
+# "format_version" attribute of the root of the files.
+# 1 (or no attribute): One group "{ipath}/{ip}/" for each point.
+# 2: One dataset for each quantity with the leading (ipath, ip) axes.
+FORMAT_VERSION_GROUPS = 1
+FORMAT_VERSION_CONSOLIDATED = 2
+
+# Group storing the actual shapes of the items padded in the datasets.
+SHAPES_GROUP = '_shapes/'
+
+# Boolean dataset (npaths, npoints) marking the points completely written.
+COMPLETED_KEY = '_completed'
+
+
+def get_format_version(hdf5_file):
+    return int(hdf5_file.attrs.get('format_version', FORMAT_VERSION_GROUPS))
+
+
+def is_point_completed(hdf5_file, ipath, ip):
+    """Check if the data for the point are completely written
+
+    In the groups layout, the group "{ipath}/{ip}/" has the attribute
+    "completed".  In the consolidated layout, "_completed" is used.
+    """
+    if get_format_version(hdf5_file) == FORMAT_VERSION_CONSOLIDATED:
+        return (COMPLETED_KEY in hdf5_file and
+                bool(hdf5_file[COMPLETED_KEY][ipath, ip]))
+    group = '{}/{}/'.format(ipath, ip)
+    return (group in hdf5_file and
+            bool(hdf5_file[group].attrs.get('completed', False)))
+
+
+def open_band_data(hdf5_file):
+    """Return an object to read the data for each point as "group + key"
+
+    Parameters
+    ----------
+    hdf5_file : HDF5 file object
+        Written in either of the layouts.
+    """
+    if get_format_version(hdf5_file) == FORMAT_VERSION_CONSOLIDATED:
+        return ConsolidatedReader(hdf5_file)
+    return hdf5_file
+
+
+class ConsolidatedWriter(object):
+    """Write the data for each point into datasets shared by all the points
+
+    The dataset for a quantity has the shape of (npaths, npoints, ...).
+    The axes after (npaths, npoints) are padded to the largest item
+    (e.g. the number of arms of the star and of irreps change among
+    points), and the actual shapes are written in "_shapes/".
+    The padded elements are NaN for float and complex datasets.
+    """
+    def __init__(self, hdf5_file, npaths, npoints, weights_storage='full'):
+        """
+
+        Parameters
+        ----------
+        hdf5_file : HDF5 file object
+        npaths : Integer
+        npoints : Integer
+            The number of points on each path.
+        weights_storage : String
+            "full" or "packed". See "upho.phonon.eigenstates.write_data_dict".
+        """
+        if weights_storage not in ('full', 'packed'):
+            raise ValueError(
+                'Unknown weights_storage: {}'.format(weights_storage))
+        self._hdf5_file = hdf5_file
+        self._npaths = npaths
+        self._npoints = npoints
+        self._weights_storage = weights_storage
+        # Keys for which only NaN has come, e.g. "weights_s" when irreps
+        # are not found.
+        self._keys_nan = set()
+
+        hdf5_file.attrs['format_version'] = FORMAT_VERSION_CONSOLIDATED
+        if COMPLETED_KEY not in hdf5_file:
+            hdf5_file.create_dataset(
+                COMPLETED_KEY, shape=(npaths, npoints), dtype=bool)
+
+    def write(self, ipath, ip, data_dict):
+        for k, v in data_dict.items():
+            shape_orig = np.shape(v)
+            if self._is_packed(k, v):
+                v = pack_element_pair_weights(v).astype(np.complex64)
+            v = np.asarray(v)
+
+            if k not in self._hdf5_file:
+                if is_nan_scalar(v):
+                    self._keys_nan.add(k)
+                    continue
+                self._create_dataset(k, v)
+                self._keys_nan.discard(k)
+
+            dataset = self._hdf5_file[k]
+            ndim = dataset.ndim - 2
+            if ndim == 0:
+                dataset[ipath, ip] = v
+                continue
+            if v.ndim != ndim:  # NaN for an array quantity
+                continue
+
+            shape_new = tuple(
+                max(n, m) for n, m in zip(dataset.shape[2:], v.shape))
+            if shape_new != dataset.shape[2:]:
+                dataset.resize(dataset.shape[:2] + shape_new)
+            slices = tuple(slice(0, n) for n in v.shape)
+            dataset[(ipath, ip) + slices] = v
+            self._hdf5_file[SHAPES_GROUP + k][ipath, ip] = shape_orig
+        self._hdf5_file[COMPLETED_KEY][ipath, ip] = True
+
+    def close(self):
+        """Create the datasets for which only NaN has come"""
+        for k in self._keys_nan:
+            self._hdf5_file.create_dataset(
+                k, shape=(self._npaths, self._npoints), dtype=float,
+                fillvalue=np.nan)
+        self._keys_nan = set()
+
+    def _is_packed(self, k, v):
+        return (self._weights_storage == 'packed' and
+                k in ELEMENT_PAIR_WEIGHTS_KEYS and np.ndim(v) >= 5)
+
+    def _create_dataset(self, k, v):
+        hdf5_file = self._hdf5_file
+        shape = (self._npaths, self._npoints) + v.shape
+
+        kwargs = {}
+        if v.dtype.kind in 'SUO':
+            kwargs['dtype'] = h5py.string_dtype()
+        else:
+            kwargs['dtype'] = v.dtype
+            if v.dtype.kind in 'fc':
+                kwargs['fillvalue'] = np.array(np.nan, dtype=v.dtype)
+
+        if v.ndim > 0:
+            kwargs['maxshape'] = shape[:2] + (None, ) * v.ndim
+            kwargs['chunks'] = (1, 1) + tuple(max(n, 1) for n in v.shape)
+            kwargs['compression'] = 'gzip'
+
+        dataset = hdf5_file.create_dataset(k, shape=shape, **kwargs)
+
+        if v.ndim > 0:
+            if self._is_packed_key(k):
+                dataset.attrs['storage'] = 'packed'
+            ndim_orig = v.ndim + 3 if self._is_packed_key(k) else v.ndim
+            hdf5_file.create_dataset(
+                SHAPES_GROUP + k,
+                shape=(self._npaths, self._npoints, ndim_orig),
+                dtype=int,
+                fillvalue=-1)
+
+    def _is_packed_key(self, k):
+        return (self._weights_storage == 'packed' and
+                k in ELEMENT_PAIR_WEIGHTS_KEYS)
+
+
+class ConsolidatedReader(object):
+    """Read the consolidated layout in the same way as the groups layout
+
+    "reader['{ipath}/{ip}/' + key]" gives the item of the point with the
+    original shape, and "reader['{ipath}/{ip}/']" gives an object for
+    the point.  Other keys are passed to the HDF5 file object.
+    """
+    def __init__(self, hdf5_file):
+        self._hdf5_file = hdf5_file
+
+    def __contains__(self, key):
+        split = self._split_key(key)
+        if split is None:
+            return key in self._hdf5_file
+        return split[2] in self._hdf5_file
+
+    def __getitem__(self, key):
+        split = self._split_key(key)
+        if split is None:
+            return self._hdf5_file[key]
+        ipath, ip, k = split
+        if k == '':
+            return PointData(self, '{}/{}/'.format(ipath, ip))
+        return self._read_item(ipath, ip, k)
+
+    def _split_key(self, key):
+        items = key.split('/', 2)
+        if len(items) != 3:
+            return None
+        try:
+            return int(items[0]), int(items[1]), items[2]
+        except ValueError:
+            return None
+
+    def _read_item(self, ipath, ip, k):
+        hdf5_file = self._hdf5_file
+        dataset = hdf5_file[k]
+        if dataset.ndim == 2:
+            return convert_strings(np.array(dataset[ipath, ip]))
+
+        shape = tuple(hdf5_file[SHAPES_GROUP + k][ipath, ip])
+        if any(n < 0 for n in shape):  # NaN for an array quantity
+            return np.array(np.nan)
+
+        is_packed = (dataset.attrs.get('storage', 'full') == 'packed')
+        if is_packed:
+            n = shape[-5] * shape[-4]
+            shape_stored = shape[:-5] + (n * (n + 1) // 2, shape[-1])
+        else:
+            shape_stored = shape
+
+        slices = tuple(slice(0, n) for n in shape_stored)
+        data = convert_strings(np.array(dataset[(ipath, ip) + slices]))
+        if is_packed:
+            data = unpack_element_pair_weights(data, shape)
+        return data
+
+
+class PointData(object):
+    def __init__(self, reader, group):
+        self._reader = reader
+        self._group = group
+
+    def __contains__(self, key):
+        return (self._group + key) in self._reader
+
+    def __getitem__(self, key):
+        return self._reader[self._group + key]
+
+
+def is_nan_scalar(v):
+    return v.ndim == 0 and v.dtype.kind == 'f' and np.isnan(v)
+
+
+def convert_strings(data):
+    """Convert strings read as objects to bytes as in the groups layout"""
+    if data.dtype.kind == 'O':
+        data = np.array(data.tolist(), dtype='S')
+    return data
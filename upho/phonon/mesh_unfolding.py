@@ -4,12 +4,17 @@ from __future__ import absolute_import, division, print_function
 
 __author__ = "Yuji Ikeda"
 
+import logging
 import numpy as np
 from phonopy.units import VaspToTHz
 from phonopy.structure.grid_points import GridPoints
 from phonopy.phonon.mesh import Mesh
 from phonopy.structure.cells import get_primitive
 from upho.phonon.eigenstates import Eigenstates
+from upho.phonon.parallel import extract_eigenstates_data
+from upho.phonon.checkpoint import create_input_hash, open_hdf5_file
+
+logger = logging.getLogger(__name__)
 
 
 class MeshUnfolding(Mesh):
@@ -28,7 +33,21 @@ class MeshUnfolding(Mesh):
                  rotations=None, # Point group operations in real space
                  factor=VaspToTHz,
                  use_lapack_solver=False,
-                 mode="eigenvector"):
+                 mode="eigenvector",
+                 n_workers=1,
+                 cache_dir=None,
+                 checkpoint_filename=None,
+                 is_resumed=False):
+        """
+
+        checkpoint_filename:
+            HDF5 file to which the frequencies and the weights are written
+            for each q-point.  Not written if None.
+        is_resumed:
+            If True and "checkpoint_filename" exists, the q-points
+            completed in the file are not computed again.  The file must
+            have been made with the same inputs.
+        """
 
         self._mesh = np.array(mesh, dtype='intc')
         self._is_eigenvectors = is_eigenvectors
@@ -60,14 +79,23 @@ class MeshUnfolding(Mesh):
         self._weights = self._gp.get_ir_grid_weights()
 
         self._star = star
-
-        self._eigenstates_unfolding = Eigenstates(
-            dynamical_matrix,
-            unitcell_ideal,
-            primitive_matrix_ideal,
-            mode=mode,
-            star=star,
-            verbose=False)
+        self._n_workers = n_workers
+        self._checkpoint_filename = checkpoint_filename
+        self._is_resumed = is_resumed
+
+        self._eigenstates_kwargs = {
+            'dynamical_matrix': dynamical_matrix,
+            'unitcell_ideal': unitcell_ideal,
+            'primitive_matrix_ideal': primitive_matrix_ideal,
+            'mode': mode,
+            'star': star,
+            'factor': factor,
+            'cache_dir': cache_dir,
+            'verbose': False,
+        }
+        if n_workers == 1:
+            self._eigenstates_unfolding = Eigenstates(
+                **self._eigenstates_kwargs)
 
         self._frequencies = None
         self._eigenvalues = None
@@ -81,6 +109,9 @@ class MeshUnfolding(Mesh):
     def get_pr_weights(self):
         return self._pr_weights
 
+    def get_eigenvalues(self):
+        return self._eigenvalues
+
     def write_yaml(self):
         w = open('mesh.yaml', 'w')
         eigenvalues = self._eigenvalues
@@ -139,14 +170,81 @@ class MeshUnfolding(Mesh):
             print("ERROR: _use_lapack_solver is not considered for this script.")
             raise ValueError
         else:
-            for i, q in enumerate(self._qpoints):
-                eigvals, eigvecs, self._pr_weights[i], nstar = (
-                    self._eigenstates_unfolding.extract_eigenstates(q)
-                )
-                self._eigenvalues[i] = eigvals.real
-                if self._is_eigenvectors:
-                    self._eigenvectors[i] = eigvecs
-            self._frequencies = np.array(np.sqrt(abs(self._eigenvalues)) *
-                                         np.sign(self._eigenvalues),
-                                         dtype='double',
-                                         order='C') * self._factor
+            distances = np.zeros(num_qpoints)
+            indices = np.arange(num_qpoints)
+            arrays = self._get_arrays()
+            checkpoint = self._open_checkpoint(arrays)
+            try:
+                if checkpoint is not None:
+                    completed = np.array(checkpoint['completed'])
+                    for k, v in arrays.items():
+                        v[completed] = np.array(checkpoint[k])[completed]
+                    indices = indices[~completed]
+                    if np.any(completed):
+                        logger.info('%d of %d q-points are already completed.',
+                                    np.sum(completed), num_qpoints)
+                data_kwargs = {
+                    'is_eigenvalues': True,
+                    'is_eigenvectors': self._is_eigenvectors,
+                }
+                if self._n_workers == 1:
+                    data_dicts = self._extract_eigenstates_data(
+                        self._qpoints[indices], distances[indices],
+                        data_kwargs)
+                else:
+                    data_dicts = extract_eigenstates_data(
+                        self._eigenstates_kwargs,
+                        self._qpoints[indices],
+                        distances[indices],
+                        self._n_workers,
+                        data_kwargs=data_kwargs)
+                for i, data_dict in zip(indices, data_dicts):
+                    if data_dict['num_arms'] != 1:
+                        raise ValueError('Mesh unfolding is available only '
+                                         'for star="none".')
+                    for k, v in arrays.items():
+                        v[i] = data_dict[k][0]
+                    if checkpoint is not None:
+                        for k, v in arrays.items():
+                            checkpoint[k][i] = v[i]
+                        checkpoint['completed'][i] = True
+                        checkpoint.flush()
+            finally:
+                if checkpoint is not None:
+                    checkpoint.close()
+
+    def _get_arrays(self):
+        """Return the arrays filled for each q-point by the data dicts
+
+        The keys are those of "Eigenstates.get_data_dict".
+        """
+        arrays = {
+            'eigenvalues': self._eigenvalues,
+            'frequencies': self._frequencies,
+            'weights_t': self._pr_weights,
+        }
+        if self._is_eigenvectors:
+            arrays['eigenvectors'] = self._eigenvectors
+        return arrays
+
+    def _open_checkpoint(self, arrays):
+        if self._checkpoint_filename is None:
+            return None
+        input_hash = create_input_hash(
+            self._eigenstates_kwargs, [self._qpoints, self._is_eigenvectors])
+        checkpoint, is_new = open_hdf5_file(
+            self._checkpoint_filename, input_hash, self._is_resumed)
+        if is_new:
+            checkpoint.create_dataset('qpoints', data=self._qpoints)
+            for k, v in arrays.items():
+                checkpoint.create_dataset(k, shape=v.shape, dtype=v.dtype)
+            checkpoint.create_dataset(
+                'completed', shape=(len(self._qpoints), ), dtype=bool)
+        return checkpoint
+
+    def _extract_eigenstates_data(self, qpoints, distances, data_kwargs):
+        eigenstates = self._eigenstates_unfolding
+        for q, distance in zip(qpoints, distances):
+            eigenstates.set_distance(distance)
+            eigenstates.extract_eigenstates(q)
+            yield eigenstates.get_data_dict(**data_kwargs)
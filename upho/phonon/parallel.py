@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+from concurrent.futures import ProcessPoolExecutor
+from upho.phonon.eigenstates import Eigenstates
+from upho.analysis.time_measurer import get_profiler
+
+# "Eigenstates" object built once in each worker process.
+_eigenstates = None
+# Keyword arguments of "Eigenstates.get_data_dict" in each worker process.
+_data_kwargs = None
+
+
+def _initialize_worker(eigenstates_kwargs, is_profiled=False,
+                       data_kwargs=None):
+    global _eigenstates, _data_kwargs
+    profiler = get_profiler()
+    profiler.reset()
+    profiler.set_enabled(is_profiled)
+    _eigenstates = Eigenstates(**eigenstates_kwargs)
+    _data_kwargs = {} if data_kwargs is None else data_kwargs
+
+
+def _extract_data(qpoint_and_distance):
+    qpoint, distance = qpoint_and_distance
+    _eigenstates.set_distance(distance)
+    _eigenstates.extract_eigenstates(qpoint)
+    # The timings since the last call, including the setup for the first
+    # call, are sent to be merged in the main process.
+    return (_eigenstates.get_data_dict(**_data_kwargs),
+            get_profiler().pop_data())
+
+
+def create_chunksize(nqpoints, n_workers):
+    """Create the number of q-points sent to a worker at once.
+
+    Several chunks per worker are made to balance the load because the
+    number of arms of the star can be different among q-points.
+    """
+    return max(1, nqpoints // (4 * n_workers))
+
+
+def extract_eigenstates_data(eigenstates_kwargs, qpoints, distances,
+                             n_workers, executor_class=None,
+                             data_kwargs=None):
+    """Extract eigenstates at q-points using a process pool.
+
+    Parameters
+    ----------
+    eigenstates_kwargs : dictionary
+        Keyword arguments to build "Eigenstates" in each worker.
+    qpoints : (nqpoints, 3) array
+        Reciprocal space points in fractional coordinates for "PC".
+    distances : (nqpoints) array
+        Distances written together with the data.
+    n_workers : Integer
+        The number of worker processes.
+    executor_class : Class or None
+        Executor with the same signature as "ProcessPoolExecutor", i.e.,
+        "executor_class(max_workers, initializer, initargs)", e.g.
+        "mpi4py.futures.MPIPoolExecutor" for MPI launchers.
+        If None, "ProcessPoolExecutor" is used.
+    data_kwargs : dictionary or None
+        Keyword arguments of "Eigenstates.get_data_dict", e.g.
+        {"is_eigenvectors": True}.
+
+    Yields
+    ------
+    data_dict : dictionary
+        Data obtained by "Eigenstates.get_data_dict", in the order of
+        "qpoints".
+    """
+    chunksize = create_chunksize(len(qpoints), n_workers)
+    profiler = get_profiler()
+    initargs = (eigenstates_kwargs, profiler.is_enabled(), data_kwargs)
+    if executor_class is None:
+        executor_class = ProcessPoolExecutor
+    with executor_class(max_workers=n_workers,
+                        initializer=_initialize_worker,
+                        initargs=initargs) as executor:
+        for data_dict, profile in executor.map(_extract_data,
+                                               zip(qpoints, distances),
+                                               chunksize=chunksize):
+            profiler.merge(profile)
+            yield data_dict
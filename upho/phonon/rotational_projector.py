@@ -24,6 +24,9 @@ class RotationalProjector(object):
         self._atoms = atoms
         self._symmetry = UnfolderSymmetry(atoms)
 
+        # Group data which do not change for the same little group.
+        self._group_data_cache = {}
+
     def create_standard_rotations(self, kpoint):
         """
         Create standard rotations for IR labels
@@ -56,12 +59,9 @@ class RotationalProjector(object):
             e^{-i (\mathbf{R}_i^T \mathbf{k} - \mathbf{k}) \cdot \mathbf{w}_j,
 
         """
-        nsyms = len(rotations)
-        factor_system = np.zeros((nsyms, nsyms), dtype=complex)
-        for i, rotation in enumerate(rotations):
-            for j, translation in enumerate(translations):
-                kdiff = np.dot(rotation.T, kpoint) - kpoint
-                factor_system[i, j] = np.exp(-2.0j * np.pi * np.dot(kdiff, translation))
+        kdiffs = np.dot(np.transpose(rotations, (0, 2, 1)), kpoint) - kpoint
+        factor_system = np.exp(
+            -2.0j * np.pi * np.dot(kdiffs, np.transpose(translations)))
         return factor_system
 
     @staticmethod
@@ -130,11 +130,9 @@ class RotationalProjector(object):
     def _create_mappings(self, rotations, translations):
         structure_analyzer = StructureAnalyzer(self._atoms)
 
-        mappings = []
-        for r, t in zip(rotations, translations):
-            mapping = structure_analyzer.extract_mapping_for_symopr(r, t)
-            mappings.append(mapping)
-        self._mappings = np.array(mappings)
+        mappings = structure_analyzer.extract_mappings_for_symops(
+            rotations, translations)
+        self._mappings = mappings
         self._mappings_modifier = MappingsModifier(mappings)
 
     def _invert_mappings(self):
@@ -185,38 +183,34 @@ class RotationalProjector(object):
             )
             raise ValueError(errmsg)
 
-        self._create_mappings(rotations, translations)
-
-        characters = self._assign_characters_to_rotations(
-            rotations, arm_transformation)
+        ndim = kpoint.shape[0]  # The number of dimensions of space
+        order = rotations.shape[0]
 
-        rotations_cart = self._create_rotations_cart(rotations)
+        group_data = self._get_group_data(
+            rotations, translations, arm_transformation, ndim)
+        characters = group_data['characters']
+        rotations_cart = group_data['rotations_cart']
+        expanded_mappings_inv = group_data['expanded_mappings_inv']
 
         ir_dimensions = self._ir_dimensions
 
         natoms = self._atoms.get_number_of_atoms()
-        ndim = kpoint.shape[0]  # The number of dimensions of space
-        order = rotations.shape[0]
-
-        expanded_mappings_inv = self._mappings_modifier.expand_mappings(
-            ndim, is_inverse=True)
 
         # scaled_positions = self._atoms.get_scaled_positions()
         # phases = np.exp(2.0j * np.pi * np.dot(scaled_positions, kpoint))
         # phases = np.repeat(phases, ndim)
 
-        shape = (len(ir_dimensions), ) + vectors.shape
-        projected_vectors = np.zeros(shape, dtype=vectors.dtype)
-        for i, (r, expanded_mapping_inv) in enumerate(zip(rotations_cart, expanded_mappings_inv)):
-            tmp = vectors[..., expanded_mapping_inv, :]
-
-            tmp2 = np.zeros_like(vectors)
-            for iatom in range(natoms):
-                tmp2[..., (3 * iatom):(3 * (iatom + 1)), :] = np.einsum(
-                    'ij,...jk->...ik', r, tmp[..., (3 * iatom):(3 * (iatom + 1)), :]
-                )
+        # All the rotations are applied at once to all the atoms.
+        # (..., order, natoms * ndim, nbands)
+        tmp = vectors[..., expanded_mappings_inv, :]
+        shape = tmp.shape
+        tmp = tmp.reshape(shape[:-2] + (natoms, ndim, shape[-1]))
+        tmp = np.matmul(rotations_cart[:, None], tmp).reshape(shape)
 
-            projected_vectors += (tmp2[None].T * np.conj(characters[i, :])).T
+        # Contraction with the characters over the rotations.
+        # (nirreps, ..., natoms * ndim, nbands)
+        projected_vectors = np.tensordot(
+            np.conj(characters), tmp, axes=([0], [-3]))
 
         # projected_vectors *= phases[None, :, None]
         projected_vectors = (projected_vectors.T * ir_dimensions[:]).T
@@ -224,6 +218,40 @@ class RotationalProjector(object):
 
         return projected_vectors
 
+    def _get_group_data(self, rotations, translations, arm_transformation, ndim):
+        """Get data for the little group, which are memoized.
+
+        Along a band path, the little group is identical for all interior
+        points of a segment, and the data are reused for such points.
+        The key includes the standard rotations because the characters are
+        assigned based on them.
+        """
+        key = (
+            np.array(rotations, dtype=int).tobytes(),
+            (np.round(translations, decimals=8) + 0.0).tobytes(),
+            np.array(arm_transformation, dtype=int).tobytes(),
+            np.array(self._standard_rotations, dtype=int).tobytes(),
+            ndim,
+        )
+        if key in self._group_data_cache:
+            group_data = self._group_data_cache[key]
+            self._mappings = group_data['mappings']
+            self._mappings_modifier = MappingsModifier(group_data['mappings'])
+            return group_data
+
+        self._create_mappings(rotations, translations)
+
+        group_data = {
+            'mappings': self._mappings,
+            'expanded_mappings_inv': self._mappings_modifier.expand_mappings(
+                ndim, is_inverse=True),
+            'rotations_cart': self._create_rotations_cart(rotations),
+            'characters': self._assign_characters_to_rotations(
+                rotations, arm_transformation),
+        }
+        self._group_data_cache[key] = group_data
+        return group_data
+
     def get_ir_labels(self):
         return self._ir_labels
 
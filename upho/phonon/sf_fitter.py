@@ -2,49 +2,205 @@
 # -*- coding: utf-8 -*-
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import h5py
 import numpy as np
 from scipy.optimize import curve_fit
 from upho.analysis.functions import FittingFunctionFactory
+from upho.analysis.least_squares import fit_peaks
 from upho.irreps.irreps import extract_degeneracy_from_ir_label
+from upho.phonon.hdf5_layout import open_band_data
+from upho.phonon.parallel import create_chunksize
+from upho.log import log_point
+
+logger = logging.getLogger(__name__)
 
 __author__ = 'Yuji Ikeda'
 
+# Ratio of the fitting errors regarded as a jump in the continuation.
+JUMP_RATIO = 2.0
+
+
+# Object to fit spectral functions in each worker process.
+_sf_fitter = None
+
+
+def _initialize_worker(filename, name, solver, is_continued):
+    global _sf_fitter
+    _sf_fitter = SFFitterWorker(filename, name, solver, is_continued)
+
+
+def _fit_groups(groups):
+    return _sf_fitter._fit_groups(groups)
+
 
 class SFFitter(object):
-    def __init__(self, filename='sf.hdf5', name='gaussian'):
-        self._name = name
+    def __init__(self, filename='sf.hdf5', name='gaussian',
+                 solver='curve_fit', n_workers=1, is_continued=False):
+        """
+
+        Parameters
+        ----------
+        solver : String
+            "curve_fit" fits each irrep by "scipy.optimize.curve_fit".
+            "batched" fits all the irreps of many q-points at once by
+            "upho.analysis.least_squares.fit_peaks" with analytic Jacobians.
+        n_workers : Integer
+            The number of worker processes sharing q-points.
+            Each worker opens "filename" read-only, and the results are
+            written by the present process.
+        is_continued : Bool
+            If True, the fit at each point is started from the fitted
+            parameters at the previous point on the same path when the
+            irreps are the same. If the fitting error becomes larger than
+            "JUMP_RATIO" times that at the previous point, the fit is
+            redone from the initial guess from the maximum of the
+            spectral function, and the better one is taken.
+        """
+        self._set_parameters(name, solver, is_continued)
+        self._filename = filename
+        self._n_workers = n_workers
 
         with h5py.File(filename, 'r') as f:
-            self._band_data = f
+            self._band_data = open_band_data(f)
             self._run()
 
+    def _set_parameters(self, name, solver, is_continued):
+        if solver not in ('curve_fit', 'batched'):
+            raise ValueError('Unknown solver: {}'.format(solver))
+        self._name = name
+        self._solver = solver
+        self._is_continued = is_continued
+
     def _run(self):
         band_data = self._band_data
 
         npaths, npoints = band_data['paths'].shape[:2]
-        frequencies = band_data['frequencies']
-        frequencies = np.array(frequencies)
         self._is_squared = np.array(band_data['is_squared'])
 
+        # Each path is a batch for "batched".
+        batches = []
+        for ipath in range(npaths):
+            batches.append(
+                ['{}/{}/'.format(ipath, ip) for ip in range(npoints)])
+
         filename_sf = 'sf_fit.hdf5'
         with h5py.File(filename_sf, 'w') as f:
             self.print_header(f)
-            for ipath in range(npaths):
-                for ip in range(npoints):
-                    print(ipath, ip)
-                    group = '{}/{}/'.format(ipath, ip)
+            for group, results in self._fit_batches(batches):
+                log_point(logger, group, npoints)
+                self._write(f, group, *results)
+
+    def _fit_batches(self, batches):
+        """
+
+        Yields
+        ------
+        group : String
+        results : Tuple
+            Returned by "_fit_spectral_functions".
+        """
+        if self._n_workers == 1:
+            for groups in batches:
+                for group, results in zip(groups, self._fit_groups(groups)):
+                    yield group, results
+            return
+
+        if self._is_continued:
+            # Paths must not be divided for the continuation.
+            chunks = batches
+        else:
+            # Batches are divided to share them among the workers.
+            groups_all = [g for groups in batches for g in groups]
+            chunksize = create_chunksize(len(groups_all), self._n_workers)
+            chunks = [groups_all[i:i + chunksize]
+                      for i in range(0, len(groups_all), chunksize)]
+        # Workers are spawned not to inherit the HDF5 file opened here.
+        with ProcessPoolExecutor(
+                max_workers=self._n_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_initialize_worker,
+                initargs=(self._filename, self._name, self._solver,
+                          self._is_continued)) as executor:
+            for groups, results_chunk in zip(
+                    chunks, executor.map(_fit_groups, chunks)):
+                for group, results in zip(groups, results_chunk):
+                    yield group, results
+
+    def _fit_groups(self, groups):
+        band_data = self._band_data
+        frequencies = np.array(band_data['frequencies'])
+        self._is_squared = np.array(band_data['is_squared'])
+        points_data = [band_data[group] for group in groups]
+        if self._is_continued:
+            return self._fit_spectral_functions_continued(
+                frequencies, points_data)
+        if self._solver == 'batched':
+            return self._fit_spectral_functions_batched(
+                frequencies, points_data)
+        return [self._fit_spectral_functions(frequencies, point_data)
+                for point_data in points_data]
+
+    def _fit_point(self, frequencies, point_data, p0s=None):
+        if self._solver == 'batched':
+            return self._fit_spectral_functions_batched(
+                frequencies, [point_data], [p0s])[0]
+        return self._fit_spectral_functions(
+            frequencies, point_data, p0s=p0s)
 
-                    peak_positions, widths, norms, fiterrs, sf_fittings = (
-                        self._fit_spectral_functions(
-                            frequencies,
-                            point_data=band_data[group],
-                        )
-                    )
+    def _fit_spectral_functions_continued(self, frequencies, points_data):
+        """Fit points on a path sequentially from the previous point
 
-                    self._write(f, group, peak_positions, widths, norms, fiterrs, sf_fittings)
+        Returns
+        -------
+        results : List of tuples
+            Same as "_fit_spectral_functions" for each point.
+        """
+        results = []
+        ir_labels_prev = None
+        for point_data in points_data:
+            ir_labels = np.array(point_data['ir_labels'])
+            if (ir_labels_prev is None or
+                    not np.array_equal(ir_labels, ir_labels_prev)):
+                results.append(self._fit_point(frequencies, point_data))
+                ir_labels_prev = ir_labels
+                continue
 
-    def _fit_spectral_functions(self, frequencies, point_data, prec=1e-6):
+            peaks_prev, widths_prev, _, fiterrs_prev = results[-1][:4]
+            p0s = np.stack((peaks_prev, widths_prev), axis=-1)
+            results_warm = self._fit_point(frequencies, point_data, p0s)
+
+            is_jumped = results_warm[3] > JUMP_RATIO * fiterrs_prev
+            if np.any(is_jumped):
+                results_cold = self._fit_point(frequencies, point_data)
+                results_warm = select_better_fits(
+                    results_warm, results_cold, is_jumped)
+            results.append(results_warm)
+            ir_labels_prev = ir_labels
+        return results
+
+    def _create_initial_parameters(self, frequencies, sf, point_data, i):
+        peak_position = self._create_initial_peak_position(frequencies, sf)
+        width         = self._create_initial_width()
+
+        if self._is_squared:
+            norm = self._create_initial_norm(frequencies, sf)
+        else:
+            ir_label = str(point_data['ir_labels'][i], encoding='ascii')
+            norm = float(extract_degeneracy_from_ir_label(ir_label))
+        return peak_position, width, norm
+
+    def _fit_spectral_functions(self, frequencies, point_data, prec=1e-6,
+                                p0s=None):
+        """
+
+        Parameters
+        ----------
+        p0s : (num_irreps, 2) array
+            Initial peak positions and widths. Not used for NaN.
+        """
         partial_sf_s = point_data['partial_sf_s']
         num_irreps = np.array(point_data['num_irreps'])
         dfreq = frequencies[1] - frequencies[0]
@@ -58,6 +214,7 @@ class SFFitter(object):
         norms          = []
         fiterrs = []
         sf_fittings = []
+        nfevs = []
         for i in range(num_irreps):
             sf = partial_sf_s[:, i]
             if np.sum(sf) < prec:
@@ -66,23 +223,22 @@ class SFFitter(object):
                 norm          = np.nan
                 fiterr = np.nan
                 sf_fitting = np.full(frequencies.shape, np.nan)
+                nfev = 0
             else:
-                peak_position = self._create_initial_peak_position(frequencies, sf)
-                width         = self._create_initial_width()
-
-                if self._is_squared:
-                    norm = self._create_initial_norm(frequencies, sf)
-                else:
-                    ir_label = str(point_data['ir_labels'][i], encoding='ascii')
-                    norm = float(extract_degeneracy_from_ir_label(ir_label))
+                peak_position, width, norm = self._create_initial_parameters(
+                    frequencies, sf, point_data, i)
+                if p0s is not None and np.all(np.isfinite(p0s[i])):
+                    peak_position, width = p0s[i]
 
                 def f(x, p, w):
                     return fitting_function(x, p, w, norm)
 
                 p0 = [peak_position, width]
                 maxfev = create_maxfev(p0)
-                fit_params, pcov = curve_fit(
-                    f, frequencies, sf, p0=p0, maxfev=maxfev)
+                fit_params, pcov, infodict, mesg, ier = curve_fit(
+                    f, frequencies, sf, p0=p0, maxfev=maxfev,
+                    full_output=True)
+                nfev = infodict['nfev']
                 fiterr = np.sqrt(np.sum((f(frequencies, *fit_params) - sf) ** 2)) * dfreq
 
                 peak_position = fit_params[0]
@@ -95,14 +251,93 @@ class SFFitter(object):
             norms         .append(norm)
             fiterrs.append(fiterr)
             sf_fittings.append(sf_fitting)
+            nfevs.append(nfev)
 
         peak_positions = np.array(peak_positions)
         widths         = np.array(widths)
         norms          = np.array(norms)
         fiterrs = np.asarray(fiterrs)
         sf_fittings = np.asarray(sf_fittings)
+        nfevs = np.asarray(nfevs, dtype=int)
+
+        return peak_positions, widths, norms, fiterrs, sf_fittings, nfevs
+
+    def _fit_spectral_functions_batched(self, frequencies, points_data,
+                                        p0s_points=None, prec=1e-6):
+        """Fit all the irreps of all the points at once
 
-        return peak_positions, widths, norms, fiterrs, sf_fittings
+        Parameters
+        ----------
+        p0s_points : List of (num_irreps, 2) arrays or None
+            Initial peak positions and widths for each point.
+            Not used for None or NaN.
+
+        Returns
+        -------
+        results : List of tuples
+            Same as "_fit_spectral_functions" for each point.
+        """
+        dfreq = frequencies[1] - frequencies[0]
+
+        factory = FittingFunctionFactory(name=self._name, is_normalized=False)
+        fitting_function = factory.create()
+        jacobian = factory.create_jacobian()
+
+        # Irreps with nonzero spectral functions are gathered.
+        indices = []
+        sfs = []
+        p0 = []
+        norms_fixed = []
+        for j, point_data in enumerate(points_data):
+            partial_sf_s = np.array(point_data['partial_sf_s'])
+            num_irreps = int(np.array(point_data['num_irreps']))
+            for i in range(num_irreps):
+                sf = partial_sf_s[:, i]
+                if np.sum(sf) < prec:
+                    continue
+                peak_position, width, norm = self._create_initial_parameters(
+                    frequencies, sf, point_data, i)
+                if p0s_points is not None and p0s_points[j] is not None:
+                    if np.all(np.isfinite(p0s_points[j][i])):
+                        peak_position, width = p0s_points[j][i]
+                indices.append((j, i))
+                sfs.append(sf)
+                p0.append([peak_position, width])
+                norms_fixed.append(norm)
+
+        if len(indices) > 0:
+            sfs = np.array(sfs)
+            norms_fixed = np.array(norms_fixed)
+            params, nfev = fit_peaks(
+                fitting_function, jacobian, frequencies, sfs,
+                p0, norms_fixed, maxfev=create_maxfev(p0[0]))
+            sf_fittings_fitted = fitting_function(
+                frequencies, params[:, 0, None], params[:, 1, None],
+                norms_fixed[:, None])
+            fiterrs_fitted = np.sqrt(
+                np.sum((sf_fittings_fitted - sfs) ** 2, axis=1)) * dfreq
+
+        results = []
+        for point_data in points_data:
+            num_irreps = int(np.array(point_data['num_irreps']))
+            results.append((
+                np.full(num_irreps, np.nan),
+                np.full(num_irreps, np.nan),
+                np.full(num_irreps, np.nan),
+                np.full(num_irreps, np.nan),
+                np.full((num_irreps, ) + frequencies.shape, np.nan),
+                np.zeros(num_irreps, dtype=int),
+            ))
+        for k, (j, i) in enumerate(indices):
+            peak_positions, widths, norms, fiterrs, sf_fittings, nfevs = (
+                results[j])
+            peak_positions[i] = params[k, 0]
+            widths[i] = params[k, 1]
+            norms[i] = norms_fixed[k]
+            fiterrs[i] = fiterrs_fitted[k]
+            sf_fittings[i] = sf_fittings_fitted[k]
+            nfevs[i] = nfev[k]
+        return results
 
     def _create_initial_peak_position(self, frequencies, sf, prec=1e-12):
         position = frequencies[np.argmax(sf)]
@@ -128,7 +363,7 @@ class SFFitter(object):
         file_output.create_dataset('paths'     , data=self._band_data['paths'])
         file_output['frequencies'] = self._band_data['frequencies'][...]
 
-    def _write(self, file_out, group_name, peak_positions_s, widths_s, norms_s, fiterrs, sf_fittings):
+    def _write(self, file_out, group_name, peak_positions_s, widths_s, norms_s, fiterrs, sf_fittings, nfevs):
         group = file_out.create_group(group_name)
 
         keys = [
@@ -150,8 +385,36 @@ class SFFitter(object):
         group['fitting_errors'] = fiterrs
         group['partial_sf_s'] = sf_fittings
         group['total_sf'] = np.nansum(sf_fittings, axis=0)
+        group['nfev_s'] = nfevs
+
+
+def select_better_fits(results, results_other, is_compared):
+    """Select fits with smaller errors for the compared irreps
+
+    The numbers of function evaluations are summed for the compared irreps.
+    """
+    fiterrs = results[3]
+    fiterrs_other = results_other[3]
+    is_other = is_compared & (fiterrs_other < fiterrs)
+    selected = []
+    for v, v_other in zip(results[:5], results_other[:5]):
+        mask = is_other.reshape((-1, ) + (1, ) * (np.ndim(v) - 1))
+        selected.append(np.where(mask, v_other, v))
+    nfevs = results[5] + np.where(is_compared, results_other[5], 0)
+    selected.append(nfevs)
+    return tuple(selected)
 
 
 def create_maxfev(p0):
     maxfev = 20000 * (len(p0) + 1)
-    return maxfev
\ No newline at end of file
+    return maxfev
+
+class SFFitterWorker(SFFitter):
+    """Fit spectral functions without writing them
+
+    This is used in worker processes of "SFFitter".
+    """
+    def __init__(self, filename, name, solver, is_continued):
+        self._set_parameters(name, solver, is_continued)
+        # Kept open read-only during the lifetime of the worker.
+        self._band_data = open_band_data(h5py.File(filename, 'r'))
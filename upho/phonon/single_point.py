@@ -19,6 +19,7 @@ class SinglePoint(object):
                  factor=VaspToTHz,
                  star="none",
                  mode="eigenvector",
+                 cache_dir=None,
                  verbose=False):
 
         self._qpoint = qpoint
@@ -32,6 +33,7 @@ class SinglePoint(object):
             primitive_matrix_ideal,
             mode=mode,
             star=star,
+            cache_dir=cache_dir,
             verbose=verbose)
 
         with h5py.File('point.hdf5', 'w') as f:
@@ -1,20 +1,24 @@
 import numpy as np
 from phonopy.structure.symmetry import Symmetry
+from upho.structure.setup_cache import get_cached_arrays
 
 
 class StarCreator(object):
-    def __init__(self, is_overlapping=False, atoms=None, symprec=1e-6):
+    def __init__(self, is_overlapping=False, atoms=None, symprec=1e-6,
+                 cache_dir=None):
         """
 
         Parameters
         ----------
         atoms : Phonopy Atoms object
             Atoms for primitive cell.
+        cache_dir : String
+            Directory to cache the rotations.  Not cached if None.
         """
         self.set_is_overlapping(is_overlapping)
         self._atoms = atoms
         self._symprec = symprec
-        self._create_symmetry()
+        self._create_rotations(cache_dir)
 
     def set_is_overlapping(self, is_overlapping):
         """
@@ -28,13 +32,18 @@ class StarCreator(object):
         """
         self._is_overlapping = is_overlapping
 
-    def _create_symmetry(self):
-        symmetry = Symmetry(
-            self._atoms, symprec=self._symprec, is_symmetry=True)
-        self._symmetry = symmetry
+    def _create_rotations(self, cache_dir):
+        def create_arrays():
+            symmetry = Symmetry(
+                self._atoms, symprec=self._symprec, is_symmetry=True)
+            return {'rotations': symmetry.get_dataset()["rotations"]}
+
+        self._rotations = get_cached_arrays(
+            cache_dir, 'star_rotations', [self._atoms, self._symprec],
+            create_arrays)['rotations']
 
     def get_rotations(self):
-        return self._symmetry.get_dataset()["rotations"]
+        return self._rotations
 
     def create_star(self, kpoint):
         """Create the star of the given kpoint
@@ -52,7 +61,7 @@ class StarCreator(object):
         transformation_matrices : n x 3 x 3 array
             Matrices to obtain arms of the star from the given kpoint.
         """
-        rotations = self._symmetry.get_dataset()["rotations"]
+        rotations = self._rotations
         lattice = self._atoms.get_cell()
 
         def get_dist(tmp, arm):
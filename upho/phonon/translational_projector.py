@@ -5,10 +5,14 @@ from __future__ import (absolute_import, division,
 
 __author__ = "Yuji Ikeda"
 
+import logging
 import numpy as np
 from upho.structure.structure_analyzer import (
     StructureAnalyzer, find_lattice_vectors)
 from upho.analysis.mappings_modifier import MappingsModifier
+from upho.structure.setup_cache import get_cached_arrays
+
+logger = logging.getLogger(__name__)
 
 
 class TranslationalProjector(object):
@@ -18,7 +22,7 @@ class TranslationalProjector(object):
     This class can treat spaces with any numbers of dimensions.
     The number of dimensions is determined from the given k.
     """
-    def __init__(self, primitive, unitcell_ideal, ndim=3):
+    def __init__(self, primitive, unitcell_ideal, ndim=3, cache_dir=None):
         """
 
         Parameters
@@ -29,22 +33,29 @@ class TranslationalProjector(object):
             Ideal (or average) unit cell
         ndim : Integer
             The number of dimensions of space
+        cache_dir : String
+            Directory to cache the mappings.  Not cached if None.
         """
         self._primitive = primitive
         self._unitcell_ideal = unitcell_ideal
         self._ndim = ndim
 
         lattice_vectors = self._create_lattice_vectors_in_sc()
-        mappings = self._create_mappings(lattice_vectors)
-
-        print("lattice_vectors:", lattice_vectors.shape)
-        print(lattice_vectors)
-        print("mappings:", mappings.shape)
-        print(mappings)
+        mappings = get_cached_arrays(
+            cache_dir,
+            'translational_mappings',
+            [primitive, primitive.get_primitive_matrix(), unitcell_ideal],
+            lambda: {'mappings': self._create_mappings(lattice_vectors)},
+        )['mappings']
+
+        logger.debug("lattice_vectors: %s\n%s", lattice_vectors.shape,
+                     lattice_vectors)
+        logger.debug("mappings: %s\n%s", mappings.shape, mappings)
         if np.any(mappings == -1):
             raise ValueError("Mapping is failed.")
 
         self._create_expanded_mappings(mappings, ndim)
+        self._create_index_table()
 
         self._ncells = mappings.shape[0]
 
@@ -52,6 +63,27 @@ class TranslationalProjector(object):
         mappings_modifier = MappingsModifier(mappings)
         self._expanded_mappings = mappings_modifier.expand_mappings(ndim)
 
+    def _create_index_table(self):
+        """Create the table of indices gathered for the projection.
+
+        index_table : (ncells, natoms_primitive * ndim) array
+            index_table[i, j] is the index of the vector element in SC
+            which goes to the j-th element in PC by the i-th translation.
+        """
+        p2s_map = self._primitive.get_primitive_to_supercell_map()
+        indices = MappingsModifier(p2s_map).expand_mappings(self._ndim)
+        self._index_table = self._expanded_mappings[:, indices]
+
+        # map_rows_to_primitive[k] is the element in PC to which the k-th
+        # element in SC goes.
+        index_table = self._index_table
+        if not np.array_equal(np.sort(index_table.ravel()),
+                              np.arange(index_table.size)):
+            raise ValueError("Mapping is failed.")
+        map_rows_to_primitive = np.empty(index_table.size, dtype=int)
+        map_rows_to_primitive[index_table] = np.arange(index_table.shape[1])
+        self._map_rows_to_primitive = map_rows_to_primitive
+
     def _create_lattice_vectors_in_sc(self):
         """
 
@@ -85,13 +117,9 @@ class TranslationalProjector(object):
         """
         structure_analyzer = StructureAnalyzer(self._unitcell_ideal)
 
-        eye = np.eye(3, dtype=int)
-        mappings = []
-        for lv in lattice_vectors:
-            mapping = structure_analyzer.extract_mapping_for_symopr(eye, lv)
-            mappings.append(mapping)
-
-        mappings = np.array(mappings)
+        rotations = np.tile(np.eye(3, dtype=int), (len(lattice_vectors), 1, 1))
+        mappings = structure_analyzer.extract_mappings_for_symops(
+            rotations, lattice_vectors)
 
         return mappings
 
@@ -112,21 +140,13 @@ class TranslationalProjector(object):
             This is reduced into the primitive cell.
         """
         ncells = self._ncells
-        ndim = self._ndim
-        primitive = self._primitive
-
-        p2s_map = primitive.get_primitive_to_supercell_map()
-        indices = MappingsModifier(p2s_map).expand_mappings(ndim)
-
-        expanded_mappings = self._expanded_mappings
-
-        shape = list(vectors.shape)
-        shape[-2] //= ncells
-        projected_vectors = np.zeros(shape, dtype=vectors.dtype)
 
-        for expanded_mapping in expanded_mappings:
-            jndices = expanded_mapping.take(indices)
-            projected_vectors += vectors.take(jndices, axis=-2)
+        # All the translations are gathered at once with the shape of
+        # (..., ncells, natoms_primitive * ndim, nbands).
+        # "np.sum" adds them pairwise, so the results agree with the
+        # accumulation cell by cell only to round-off.
+        projected_vectors = np.sum(
+            vectors[..., self._index_table, :], axis=-3)
 
         # The following intend;
         #     # Definition of projection operators
@@ -137,6 +157,31 @@ class TranslationalProjector(object):
 
         return projected_vectors
 
+    def project_vectors_partial(self, vectors, indices, kpoint):
+        """Project vectors which are nonzero only on some elements in SC
+
+        Parameters
+        ----------
+        vectors : (nindices, nbands) array
+            Nonzero part of the vectors for SC at kpoint.
+        indices : (nindices) array
+            Indices of the nonzero elements of the vectors in SC.
+        kpoint : (ndim) array
+            Reciprocal space point in fractional coordinates for SC.
+
+        Returns
+        -------
+        projected_vectors : (natoms_primitive * ndim, nbands) array
+            Same as "project_vectors" for the full vectors.
+        """
+        nrows = self._index_table.shape[1]
+        projected_vectors = np.zeros(
+            (nrows, ) + vectors.shape[1:], dtype=vectors.dtype)
+        np.add.at(
+            projected_vectors, self._map_rows_to_primitive[indices], vectors)
+        projected_vectors /= np.sqrt(self._ncells)
+        return projected_vectors
+
     def project_vectors_full(self, vectors, kpoint):
         """
         Project vectors onto kpoint
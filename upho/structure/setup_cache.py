@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+__author__ = "Yuji Ikeda"
+
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+# Changed when the contents of the cached arrays are changed.
+CACHE_VERSION = 1
+
+
+class SetupCache(object):
+    """Content-addressed on-disk cache of the arrays for the setup
+
+    Each entry is an npz file "{name}_{hash}.npz" in the cache directory,
+    where the hash is made from the structures, matrices, and tolerances
+    which determine the arrays.  Entries are therefore reused whenever the
+    same inputs come, e.g. when only the band paths are changed.
+    """
+    def __init__(self, cache_dir):
+        """
+
+        Parameters
+        ----------
+        cache_dir : String
+            Directory for the cache files.  Created if it does not exist.
+        """
+        self._cache_dir = cache_dir
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def get_filename(self, name, items):
+        return os.path.join(
+            self._cache_dir, '{}_{}.npz'.format(name, create_hash(items)))
+
+    def load(self, name, items):
+        """Load the arrays
+
+        Returns
+        -------
+        arrays : dictionary or None
+            None if the entry does not exist.
+        """
+        filename = self.get_filename(name, items)
+        if not os.path.isfile(filename):
+            return None
+        with np.load(filename) as data:
+            return {k: data[k] for k in data.files}
+
+    def save(self, name, items, arrays):
+        # The file is renamed after written so that other processes never
+        # read incomplete files.
+        filename = self.get_filename(name, items)
+        fd, filename_tmp = tempfile.mkstemp(
+            suffix='.npz', dir=self._cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(filename_tmp, filename)
+        except Exception:
+            os.remove(filename_tmp)
+            raise
+
+    def get(self, name, items, function):
+        """Load the arrays or create and save them
+
+        Parameters
+        ----------
+        name : String
+            Kind of the arrays.
+        items : List
+            Atoms objects, arrays, and scalars determining the arrays.
+        function : Function
+            Returns the dictionary of the arrays when they are not cached.
+        """
+        arrays = self.load(name, items)
+        if arrays is None:
+            arrays = function()
+            self.save(name, items, arrays)
+        return arrays
+
+
+def get_cached_arrays(cache_dir, name, items, function):
+    """"SetupCache.get" which simply calls "function" if "cache_dir" is None"""
+    if cache_dir is None:
+        return function()
+    return SetupCache(cache_dir).get(name, items, function)
+
+
+def create_hash(items):
+    sha = hashlib.sha256()
+    sha.update('version={}'.format(CACHE_VERSION).encode())
+    for item in items:
+        if item is None or isinstance(item, str):
+            sha.update('{!r};'.format(item).encode())
+            continue
+        if hasattr(item, 'get_scaled_positions'):  # Atoms
+            arrays = [
+                item.get_cell(),
+                item.get_scaled_positions(),
+                item.get_atomic_numbers(),
+            ]
+        else:
+            arrays = [item]
+        for array in arrays:
+            # Integer and float arrays with the same values give the same hash.
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            sha.update('{}{}'.format(array.dtype.str, array.shape).encode())
+            sha.update(array.tobytes())
+    return sha.hexdigest()
@@ -7,6 +7,7 @@ __author__ = "Yuji Ikeda"
 import sys
 import itertools
 import numpy as np
+from scipy.spatial import cKDTree
 from phonopy.structure.symmetry import Symmetry
 
 
@@ -432,21 +433,37 @@ class StructureAnalyzer(object):
 
     def get_mappings_for_symops(self, prec=1e-6):
         """Get mappings for symmetry operations."""
-        natoms = self._atoms.get_number_of_atoms()
-
         dataset = self.get_symmetry_dataset()
         rotations = dataset["rotations"]
         translations = dataset["translations"]
-        nopr = len(rotations)
-        mappings = -1 * np.ones((nopr, natoms), dtype=int)
-        for iopr, (r, t) in enumerate(zip(rotations, translations)):
-            mappings[iopr] = self.extract_mapping_for_symopr(r, t, prec)
+        return self.extract_mappings_for_symops(rotations, translations, prec)
+
+    def extract_mappings_for_symops(self, rotations, translations, prec=1e-6):
+        """Extract mappings for symmetry operations at once.
+
+        The positions are transformed by all the operations together, and
+        the transformed positions are resolved with one spatial index.
+
+        Args:
+            rotations (nopsx3x3 array): Rotation matrices.
+            translations (nopsx3 array): Translation vectors.
+
+        Returns:
+            mappings (nopsxn integral array):
+                Indices are for new numbers and contents are for old ones.
+        """
+        symbols = np.array(self._atoms.get_chemical_symbols())
+        scaled_positions = self._atoms.get_scaled_positions()
+
+        transformed_scaled_positions = transform_scaled_positions_for_symops(
+            scaled_positions, rotations, translations)
 
-        if -1 in mappings:
-            print("ERROR: {}".format(__name__))
-            print("Some atoms are not mapped by some symmetry operations.")
-            raise ValueError
-            sys.exit(1)
+        tree = create_periodic_tree(scaled_positions)
+        mappings = find_atoms_in_tree(
+            tree, transformed_scaled_positions, prec)
+
+        if not np.all(symbols[mappings] == symbols[None, :]):
+            raise ValueError('Symbols do not correspond.')
 
         return mappings
 
@@ -500,20 +517,63 @@ class StructureAnalyzer(object):
         symbols_old = np.array(self._atoms.get_chemical_symbols())
         positions_old = self._atoms.get_scaled_positions()
 
-        diff = positions_new[:, None, :] - positions_old[None, :, :]
-        wrapped_dpos = diff - np.rint(diff)
-        tmp, mapping = np.where(np.all(np.abs(wrapped_dpos) < prec, axis=2))
-
-        # Guarantee one-to-one correspondence
-        if not np.array_equal(tmp, np.arange(natoms, dtype=int)):
+        if len(positions_new) != natoms:
             raise ValueError('Mapping is failed.')
 
+        tree = create_periodic_tree(positions_old)
+        mapping = find_atoms_in_tree(tree, positions_new, prec)
+
         if not np.array_equal(symbols_new, symbols_old[mapping]):
             raise ValueError('Symbols do not correspond.')
 
         return mapping
 
 
+def wrap_scaled_positions(scaled_positions):
+    """Wrap scaled positions into [0, 1)."""
+    wrapped = np.mod(scaled_positions, 1.0)
+    # "np.mod" can give 1.0 for tiny negative values.
+    wrapped[wrapped >= 1.0] = 0.0
+    return wrapped
+
+
+def create_periodic_tree(scaled_positions):
+    """Create a KD-tree for the scaled positions in the periodic unit box."""
+    return cKDTree(wrap_scaled_positions(scaled_positions), boxsize=1.0)
+
+
+def find_atoms_in_tree(tree, positions_new, prec=1e-6):
+    """Find the atom within "prec" for each position.
+
+    The distance is the largest absolute difference among the fractional
+    coordinates with the periodic boundary condition, as in the comparison
+    of each pair of the atoms.
+
+    Args:
+        tree: cKDTree created by "create_periodic_tree" for the original
+            positions.
+        positions_new (...x3 array): Fractional positions for the
+            transformed structures.
+        prec (float): Tolerance for the fractional coordinates.
+
+    Returns:
+        mapping (... integral array): Indices of the original atoms.
+
+    Raises:
+        ValueError: If the number of the atoms within "prec" is not one for
+            some position.
+    """
+    positions_new = np.asarray(positions_new)
+    # Two neighbors are searched to detect ambiguous correspondence.
+    distances, indices = tree.query(
+        wrap_scaled_positions(positions_new.reshape(-1, 3)),
+        k=2, p=np.inf, distance_upper_bound=prec)
+    if not (np.all(distances[:, 0] < prec) and
+            np.all(np.isinf(distances[:, 1]))):
+        raise ValueError('Mapping is failed.')
+    return indices[:, 0].reshape(positions_new.shape[:-1])
+
+
 def _get_matrix(matrix):
     matrix = np.array(matrix)
     if matrix.size == 1 or matrix.size == 3:
@@ -670,3 +730,23 @@ def transform_scaled_positions(scaled_positions, rotation, translation):
     transformed_scaled_positions = np.dot(rotation, scaled_positions.T).T
     transformed_scaled_positions += translation
     return transformed_scaled_positions
+
+
+def transform_scaled_positions_for_symops(
+        scaled_positions, rotations, translations):
+    """
+
+    Args:
+        scaled_positions (nx3 array): Scaled positions.
+        rotations (nopsx3x3 array): Rotation matrices.
+        translations (nopsx3 array): Translation vectors.
+
+    Returns:
+        transformed_scaled_positions (nopsxnx3 array).
+    """
+    rotations = np.asarray(rotations)
+    translations = np.asarray(translations)
+    transformed_scaled_positions = np.matmul(
+        scaled_positions[None, :, :], np.swapaxes(rotations, -1, -2))
+    transformed_scaled_positions += translations[:, None, :]
+    return transformed_scaled_positions
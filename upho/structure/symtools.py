@@ -7,7 +7,8 @@ import spglib
 
 def get_rotations_cart(atoms):
     cell = atoms.get_cell()
-    dataset = spglib.get_symmetry_dataset(atoms)
+    dataset = spglib.get_symmetry_dataset((
+        cell, atoms.get_scaled_positions(), atoms.get_atomic_numbers()))
     rotations = dataset["rotations"]
     translations = dataset["translations"]
 